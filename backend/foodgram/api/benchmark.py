@@ -0,0 +1,503 @@
+import base64
+import json
+import math
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from io import BytesIO
+from typing import Callable
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils.crypto import get_random_string
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from recipes.clicks import click_counter
+from recipes.cook_index import cook_index
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag
+)
+from users.models import Subscription
+
+
+User = get_user_model()
+
+BASELINES_FILE = os.path.join(
+    os.path.dirname(__file__), 'benchmark_baselines.json'
+)
+
+INGREDIENTS_PER_RECIPE = 5
+
+TAGS_COUNT = 3
+
+INGREDIENTS_COUNT = 50
+
+BENCH_PASSWORD = 'Bench-password-2024'
+
+DEFAULT_SIZES = (10, 50)
+
+BYTES_TOLERANCE = 1.1
+
+
+@dataclass
+class Route:
+    name: str
+    path: str
+    params: dict = field(default_factory=dict)
+    method: str = 'get'
+    auth: bool = True
+    teardown: tuple = None
+    data: Callable = None
+    prepare: Callable = None
+
+
+@lru_cache(maxsize=None)
+def get_image_bytes():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), (200, 100, 50)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def get_image_data():
+    encoded = base64.b64encode(get_image_bytes()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+def recipe_data(context, name='Рецепт читателя'):
+    return {
+        'name': name,
+        'text': 'Описание рецепта',
+        'cooking_time': 10,
+        'image': get_image_data(),
+        'tags': [context['tag_id']],
+        'ingredients': [
+            {'id': context['ingredient_id'], 'amount': 5},
+        ],
+    }
+
+
+def batch_data(context):
+    return {'recipes': [context['spare_recipe_id']]}
+
+
+def new_user_data(context):
+    suffix = get_random_string(12).lower()
+    return {
+        'email': f'bench_new_{suffix}@example.com',
+        'username': f'bench_new_{suffix}',
+        'first_name': 'Bench',
+        'last_name': 'New',
+        'password': BENCH_PASSWORD,
+    }
+
+
+def create_own_recipe(context):
+    recipe = Recipe.objects.create(
+        author_id=context['reader_id'], name='Рецепт для удаления',
+        description='Описание рецепта', time_to_cook=5
+    )
+    return {'own_recipe_id': recipe.id}
+
+
+def set_avatar(context):
+    reader = User.objects.get(pk=context['reader_id'])
+    reader.avatar = ContentFile(get_image_bytes(), name='avatar.png')
+    reader.save()
+    return {}
+
+
+def create_spare_token(context):
+    Token.objects.filter(user_id=context['spare_author_id']).delete()
+    token = Token.objects.create(user_id=context['spare_author_id'])
+    return {'token': token.key}
+
+
+ROUTES = [
+    Route('users-list', '/api/users/', {'limit': '{size}'}),
+    Route('users-detail', '/api/users/{author_id}/'),
+    Route('users-me', '/api/users/me/'),
+    Route(
+        'users-subscriptions', '/api/users/subscriptions/',
+        {'limit': '{size}', 'recipes_limit': '3'}
+    ),
+    Route(
+        'users-subscribe', '/api/users/{spare_author_id}/subscribe/',
+        method='post',
+        teardown=('delete', '/api/users/{spare_author_id}/subscribe/')
+    ),
+    Route('tags-list', '/api/tags/'),
+    Route('tags-detail', '/api/tags/{tag_id}/'),
+    Route('ingredients-list', '/api/ingredients/'),
+    Route('ingredients-search', '/api/ingredients/', {'name': 'ингр'}),
+    Route('ingredients-detail', '/api/ingredients/{ingredient_id}/'),
+    Route('reference-data', '/api/reference-data/', auth=False),
+    Route('recipes-list', '/api/recipes/'),
+    Route('recipes-list-anonymous', '/api/recipes/', auth=False),
+    Route('recipes-list-limit', '/api/recipes/', {'limit': '{size}'}),
+    Route('recipes-list-cursor', '/api/recipes/', {
+        'cursor': '', 'limit': '{size}'
+    }),
+    Route('recipes-list-author', '/api/recipes/', {
+        'author': '{author_id}', 'limit': '{size}'
+    }),
+    Route('recipes-list-tags', '/api/recipes/', {
+        'tags': '{tag_slug}', 'limit': '{size}'
+    }),
+    Route('recipes-list-favorited', '/api/recipes/', {
+        'is_favorited': '1', 'limit': '{size}'
+    }),
+    Route('recipes-list-shopping-cart', '/api/recipes/', {
+        'is_in_shopping_cart': '1', 'limit': '{size}'
+    }),
+    Route('recipes-search', '/api/recipes/', {
+        'search': 'рецепт', 'limit': '{size}'
+    }),
+    Route('recipes-trending', '/api/recipes/', {
+        'ordering': 'trending', 'limit': '{size}'
+    }),
+    Route('recipes-what-to-cook', '/api/recipes/what_to_cook/', {
+        'ingredients': '{ingredient_id}', 'limit': '{size}'
+    }),
+    Route('recipes-feed', '/api/recipes/feed/', {'limit': '{size}'}),
+    Route('recipes-detail', '/api/recipes/{recipe_id}/'),
+    Route('recipes-similar', '/api/recipes/{recipe_id}/similar/'),
+    Route('recipes-get-link', '/api/recipes/{recipe_id}/get-link/'),
+    Route(
+        'recipes-favorite', '/api/recipes/{spare_recipe_id}/favorite/',
+        method='post',
+        teardown=('delete', '/api/recipes/{spare_recipe_id}/favorite/')
+    ),
+    Route(
+        'recipes-shopping-cart',
+        '/api/recipes/{spare_recipe_id}/shopping_cart/',
+        method='post',
+        teardown=('delete', '/api/recipes/{spare_recipe_id}/shopping_cart/')
+    ),
+    Route(
+        'recipes-download-shopping-cart',
+        '/api/recipes/download_shopping_cart/'
+    ),
+    Route('short-link-redirect', '/s/{short_link}/', auth=False),
+    Route(
+        'recipes-favorite-batch', '/api/recipes/favorite/batch/',
+        method='post', data=batch_data,
+        teardown=('delete', '/api/recipes/favorite/batch/')
+    ),
+    Route(
+        'recipes-shopping-cart-batch', '/api/recipes/shopping_cart/batch/',
+        method='post', data=batch_data,
+        teardown=('delete', '/api/recipes/shopping_cart/batch/')
+    ),
+    Route(
+        'recipes-create', '/api/recipes/', method='post',
+        data=lambda context: recipe_data(
+            context, f'Новый рецепт {get_random_string(12)}'
+        )
+    ),
+    Route(
+        'recipes-update', '/api/recipes/{own_recipe_id}/', method='patch',
+        data=recipe_data
+    ),
+    Route(
+        'recipes-delete', '/api/recipes/{own_recipe_id}/', method='delete',
+        prepare=create_own_recipe
+    ),
+    Route(
+        'uploads', '/api/uploads/', method='post',
+        data=lambda context: {
+            'file': SimpleUploadedFile(
+                'image.png', get_image_bytes(), content_type='image/png'
+            )
+        }
+    ),
+    Route(
+        'users-avatar', '/api/users/me/avatar/', method='put',
+        data=lambda context: {'avatar': get_image_data()},
+        teardown=('delete', '/api/users/me/avatar/')
+    ),
+    Route(
+        'users-avatar-delete', '/api/users/me/avatar/', method='delete',
+        prepare=set_avatar
+    ),
+    Route(
+        'users-set-password', '/api/users/set_password/', method='post',
+        data=lambda context: {
+            'current_password': BENCH_PASSWORD,
+            'new_password': BENCH_PASSWORD,
+        }
+    ),
+    Route(
+        'users-create', '/api/users/', method='post', auth=False,
+        data=new_user_data
+    ),
+    Route(
+        'token-login', '/api/auth/token/login/', method='post', auth=False,
+        data=lambda context: {
+            'email': context['reader_email'], 'password': BENCH_PASSWORD,
+        }
+    ),
+    Route(
+        'token-logout', '/api/auth/token/logout/', method='post',
+        auth=False, prepare=create_spare_token
+    ),
+]
+
+
+def seed_dataset(size):
+    authors_count = max(size // 2, 1)
+    reader = User.objects.create_user(
+        username='bench_reader', email='bench_reader@example.com',
+        password=BENCH_PASSWORD, first_name='Bench', last_name='Reader'
+    )
+    User.objects.bulk_create(
+        User(
+            username=f'bench_author_{i}',
+            email=f'bench_author_{i}@example.com',
+            first_name='Bench', last_name=f'Author {i}'
+        ) for i in range(authors_count + 1)
+    )
+    authors = list(
+        User.objects.filter(username__startswith='bench_author_')
+        .order_by('id')
+    )
+    spare_author = authors.pop()
+    Subscription.objects.bulk_create(
+        Subscription(subscriber=reader, author=author) for author in authors
+    )
+    Tag.objects.bulk_create(
+        Tag(name=f'Тег {i}', slug=f'bench-tag-{i}') for i in range(TAGS_COUNT)
+    )
+    tags = list(Tag.objects.order_by('id'))
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+        for i in range(INGREDIENTS_COUNT)
+    )
+    ingredients = list(Ingredient.objects.order_by('id'))
+    recipes = []
+    for i in range(size + 1):
+        recipe = Recipe(
+            author=authors[i % authors_count], name=f'Рецепт {i}',
+            description='Описание рецепта', time_to_cook=i % 90 + 1
+        )
+        recipe.save()
+        recipes.append(recipe)
+    spare_recipe = recipes.pop()
+    own_recipe = Recipe.objects.create(
+        author=reader, name='Рецепт читателя',
+        description='Описание рецепта', time_to_cook=5
+    )
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe=recipe, tag=tags[i % TAGS_COUNT])
+        for i, recipe in enumerate(recipes)
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe=recipe,
+            ingredient=ingredients[(i + j) % INGREDIENTS_COUNT],
+            amount=j + 1
+        )
+        for i, recipe in enumerate(recipes)
+        for j in range(INGREDIENTS_PER_RECIPE)
+    )
+    Favorite.objects.bulk_create(
+        Favorite(user=reader, recipe=recipe) for recipe in recipes[::2]
+    )
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=reader, recipe=recipe) for recipe in recipes[::3]
+    )
+    return reader, {
+        'size': size,
+        'reader_id': reader.id,
+        'reader_email': reader.email,
+        'own_recipe_id': own_recipe.id,
+        'author_id': authors[0].id,
+        'spare_author_id': spare_author.id,
+        'tag_id': tags[0].id,
+        'tag_slug': tags[0].slug,
+        'ingredient_id': ingredients[0].id,
+        'recipe_id': recipes[0].id,
+        'spare_recipe_id': spare_recipe.id,
+        'short_link': recipes[0].get_short_link(),
+    }
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def request(client, method, path, params, data=None, token=None):
+    extra = {}
+    if token is not None:
+        extra['HTTP_AUTHORIZATION'] = f'Token {token}'
+    if method == 'get':
+        return client.get(path, params, **extra)
+    if data is None:
+        return getattr(client, method)(path, **extra)
+    if any(isinstance(value, SimpleUploadedFile) for value in data.values()):
+        return getattr(client, method)(path, data, **extra)
+    return getattr(client, method)(
+        path, json.dumps(data), content_type='application/json', **extra
+    )
+
+
+def measure_route(client, route, context, repeat):
+    params = {
+        key: value.format(**context) for key, value in route.params.items()
+    }
+    timings = []
+    queries = []
+    for _ in range(repeat):
+        step_context = dict(context)
+        if route.prepare:
+            step_context.update(route.prepare(context))
+        path = route.path.format(**step_context)
+        data = route.data(step_context) if route.data else None
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = request(
+                client, route.method, path, params, data,
+                step_context.get('token')
+            )
+            body = response.getvalue()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(captured.captured_queries))
+        if route.teardown:
+            method, teardown_path = route.teardown
+            request(
+                client, method, teardown_path.format(**step_context), {},
+                data
+            )
+    return {
+        'status': response.status_code,
+        'queries': max(queries),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'max_ms': round(max(timings), 3),
+        'bytes': len(body),
+    }
+
+
+def run_size(size, repeat, routes=ROUTES):
+    reader, context = seed_dataset(size)
+    token = Token.objects.create(user=reader)
+    clients = {
+        True: Client(HTTP_AUTHORIZATION=f'Token {token.key}'),
+        False: Client(),
+    }
+    return {
+        route.name: measure_route(clients[route.auth], route, context, repeat)
+        for route in routes
+    }
+
+
+def run_benchmark(sizes, repeat, routes=ROUTES):
+    results = {}
+    with tempfile.TemporaryDirectory() as media_root, override_settings(
+        MEDIA_ROOT=os.path.join(media_root, 'media'),
+        UPLOAD_ROOT=os.path.join(media_root, 'uploads')
+    ):
+        for size in sizes:
+            cache.clear()
+            cook_index.reset()
+            click_counter.reset()
+            with transaction.atomic():
+                results[size] = run_size(size, repeat, routes)
+                transaction.set_rollback(True)
+            click_counter.reset()
+    return build_report(results, sizes, repeat, routes)
+
+
+def load_baselines(path=BASELINES_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def build_report(results, sizes, repeat, routes=ROUTES):
+    report = {}
+    for route in routes:
+        by_size = {
+            str(size): results[size][route.name] for size in sizes
+        }
+        query_counts = {item['queries'] for item in by_size.values()}
+        report[route.name] = {
+            'method': route.method.upper(),
+            'path': route.path,
+            'params': route.params,
+            'scaling': 'O(1)' if len(query_counts) == 1 else 'O(N)',
+            'results': by_size,
+        }
+    return {'sizes': list(sizes), 'repeat': repeat, 'routes': report}
+
+
+def check_budgets(report, baselines, time_tolerance=None,
+                  bytes_tolerance=BYTES_TOLERANCE):
+    violations = []
+    for name, route in report['routes'].items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            violations.append(f'{name}: нет эталонных значений')
+            continue
+        if baseline['scaling'] == 'O(1)' and route['scaling'] != 'O(1)':
+            violations.append(
+                f'{name}: число запросов растёт с размером данных'
+            )
+        for size, result in route['results'].items():
+            expected = baseline['results'].get(size)
+            if expected is None:
+                violations.append(
+                    f'{name} [{size}]: нет эталонных значений для размера'
+                )
+                continue
+            if result['status'] != expected['status']:
+                violations.append(
+                    f'{name} [{size}]: статус {result["status"]}, '
+                    f'ожидался {expected["status"]}'
+                )
+            if result['queries'] > expected['queries']:
+                violations.append(
+                    f'{name} [{size}]: {result["queries"]} запросов, '
+                    f'бюджет {expected["queries"]}'
+                )
+            bytes_budget = expected['bytes'] * bytes_tolerance
+            if result['bytes'] > bytes_budget:
+                violations.append(
+                    f'{name} [{size}]: ответ {result["bytes"]} Б, '
+                    f'бюджет {bytes_budget:.0f} Б'
+                )
+            if (
+                time_tolerance is not None
+                and result['p95_ms'] > expected['p95_ms'] * time_tolerance
+            ):
+                violations.append(
+                    f'{name} [{size}]: p95 {result["p95_ms"]} мс, '
+                    f'бюджет {expected["p95_ms"] * time_tolerance:.3f} мс'
+                )
+    return violations
+
+
+def baselines_from_report(report):
+    return {
+        name: {
+            'scaling': route['scaling'],
+            'results': {
+                size: {
+                    key: result[key]
+                    for key in ('status', 'queries', 'p95_ms', 'bytes')
+                }
+                for size, result in route['results'].items()
+            },
+        }
+        for name, route in report['routes'].items()
+    }
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Lookup
+from django.db.models.expressions import Col
+from django.db.models.sql.where import AND, WhereNode
+
+from foodgram import constants as c
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+
+
+User = get_user_model()
+
+
+COUNT_GENERATION_KEY = 'pagination-count-generation:{}'
+
+COUNTED_MODELS = (
+    Recipe, Recipe.tags.through, Favorite, ShoppingCart, Subscription, User
+)
+
+OWNER_FIELDS = {
+    Favorite: 'user', ShoppingCart: 'user', Subscription: 'subscriber'
+}
+
+
+def get_owners(node, owners=None):
+    if owners is None:
+        owners = {}
+    if node.connector != AND or node.negated:
+        return owners
+    for child in node.children:
+        if isinstance(child, WhereNode):
+            get_owners(child, owners)
+        elif (
+            isinstance(child, Lookup) and child.lookup_name == 'exact'
+            and isinstance(child.lhs, Col)
+            and OWNER_FIELDS.get(child.lhs.target.model)
+            == child.lhs.target.name
+        ):
+            owners[child.lhs.target.model._meta.db_table] = getattr(
+                child.rhs, 'pk', child.rhs
+            )
+    return owners
+
+
+def get_scope(table, owner_id=None):
+    if owner_id is None:
+        return table
+    return f'{table}:{owner_id}'
+
+
+def get_generations(query, sql):
+    owners = get_owners(query.where)
+    keys = [
+        COUNT_GENERATION_KEY.format(get_scope(table, owners.get(table)))
+        for table in sorted(
+            model._meta.db_table for model in COUNTED_MODELS
+        )
+        if f'"{table}"' in sql
+    ]
+    generations = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in generations}
+    for key, generation in missing.items():
+        cache.add(key, generation, None)
+    return [generations.get(key, missing.get(key)) for key in keys]
+
+
+def invalidate_counts(model, owner_id=None):
+    table = model._meta.db_table
+    keys = [COUNT_GENERATION_KEY.format(table)]
+    if owner_id is not None:
+        keys.append(COUNT_GENERATION_KEY.format(get_scope(table, owner_id)))
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def invalidate_instance_counts(instance):
+    field = OWNER_FIELDS.get(type(instance))
+    invalidate_counts(
+        type(instance),
+        getattr(instance, f'{field}_id') if field else None
+    )
+
+
+def get_count_key(queryset):
+    query = queryset.order_by().values('pk').query
+    sql, params = query.sql_with_params()
+    signature = hashlib.md5(
+        f'{get_generations(query, sql)}{sql}{params!r}'.encode()
+    ).hexdigest()
+    return f'pagination-count:{signature}'
+
+
+def get_table_estimate(queryset):
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return int(row[0]) if row else -1
+
+
+def get_plan_estimate(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimate_count(queryset):
+    if not queryset.query.where:
+        estimate = get_table_estimate(queryset)
+        if estimate < c.COUNT_ESTIMATE_THRESHOLD:
+            return None
+        return estimate, False
+    capped = queryset[:c.COUNT_ESTIMATE_THRESHOLD + 1].count()
+    if capped <= c.COUNT_ESTIMATE_THRESHOLD:
+        return capped, True
+    return max(get_plan_estimate(queryset), capped), False
+
+
+def get_count(queryset):
+    if queryset.query.is_empty():
+        return 0, True
+    key = get_count_key(queryset)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    result = None
+    if connections[queryset.db].vendor == 'postgresql':
+        result = estimate_count(queryset)
+    if result is None:
+        result = queryset.count(), True
+    cache.set(key, result, c.COUNT_CACHE_TIMEOUT)
+    return result
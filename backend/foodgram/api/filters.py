@@ -1,7 +1,7 @@
 import django_filters
-from django_filters import AllValuesMultipleFilter
 
-from recipes.models import Recipe
+from recipes.models import Recipe, Tag
+from recipes.search import search_recipes
 
 
 class RecipeFilter(django_filters.FilterSet):
@@ -15,7 +15,16 @@ class RecipeFilter(django_filters.FilterSet):
         field_name='shopping_cart__user',
         method='filter_is_in_shopping_cart'
     )
-    tags = AllValuesMultipleFilter(field_name='tags__slug')
+    tags = django_filters.ModelMultipleChoiceFilter(
+        field_name='tags__slug',
+        to_field_name='slug',
+        queryset=Tag.objects.all()
+    )
+    search = django_filters.CharFilter(method='filter_search')
+    ordering = django_filters.ChoiceFilter(
+        choices=[('trending', 'trending')],
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
@@ -30,3 +39,9 @@ class RecipeFilter(django_filters.FilterSet):
         if value == '1' and self.request.user.is_authenticated:
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by('-trending_score', 'pk')
@@ -0,0 +1,89 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    setup_test_environment, teardown_test_environment
+)
+
+from api.benchmark import (
+    BASELINES_FILE, BYTES_TOLERANCE, DEFAULT_SIZES, baselines_from_report,
+    check_budgets, load_baselines, run_benchmark
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет число запросов, время ответа и размер ответа '
+        'для всех маршрутов API на тестовой базе данных'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+            help='Размеры набора данных (число рецептов)'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Число повторов каждого запроса'
+        )
+        parser.add_argument(
+            '--report', default='benchmark_report.json',
+            help='Файл для отчёта в формате JSON'
+        )
+        parser.add_argument(
+            '--baselines', default=BASELINES_FILE,
+            help='Файл с эталонными значениями'
+        )
+        parser.add_argument(
+            '--time-tolerance', type=float, default=None,
+            help='Допустимое превышение эталонного p95 (множитель)'
+        )
+        parser.add_argument(
+            '--bytes-tolerance', type=float, default=BYTES_TOLERANCE,
+            help='Допустимое превышение эталонного размера ответа (множитель)'
+        )
+        parser.add_argument(
+            '--update-baselines', action='store_true',
+            help='Записать результаты как новые эталонные значения'
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = run_benchmark(options['sizes'], options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        report['violations'] = check_budgets(
+            report, load_baselines(options['baselines']),
+            options['time_tolerance'], options['bytes_tolerance']
+        )
+        with open(options['report'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        for name, route in report['routes'].items():
+            results = ', '.join(
+                f'{size}: {result["queries"]} запр. '
+                f'p95 {result["p95_ms"]} мс {result["bytes"]} Б'
+                for size, result in route['results'].items()
+            )
+            self.stdout.write(f'{name} [{route["scaling"]}] {results}')
+        if options['update_baselines']:
+            with open(options['baselines'], 'w', encoding='utf-8') as file:
+                json.dump(
+                    baselines_from_report(report), file,
+                    ensure_ascii=False, indent=2
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f'Эталонные значения записаны в {options["baselines"]}'
+            ))
+            return
+        if report['violations']:
+            for violation in report['violations']:
+                self.stderr.write(self.style.ERROR(violation))
+            raise CommandError('Превышен бюджет производительности')
+        self.stdout.write(self.style.SUCCESS(
+            f'Бюджеты соблюдены, отчёт записан в {options["report"]}'
+        ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from api.uploads import clear_uploads
+
+
+class Command(BaseCommand):
+    help = 'Удаляет загруженные изображения с истёкшим токеном'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено загрузок: {clear_uploads()}'
+        ))
@@ -1,8 +1,175 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.paginator import Paginator
+from django.db.models import F, OrderBy, Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
+from api.counts import get_count
 from foodgram import constants as c
 
 
+class CachedCountPaginator(Paginator):
+    count_exact = True
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return len(self.object_list)
+        count, self.count_exact = get_count(self.object_list)
+        return count
+
+
 class FoodGramPagination(PageNumberPagination):
+    django_paginator_class = CachedCountPaginator
     page_size_query_param = 'limit'
     page_size = c.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(
+            request.query_params[self.cursor_query_param]
+        )
+        keys = self.get_sort_keys(queryset)
+        names = [f'cursor_key_{index}' for index in range(len(keys))]
+        queryset = queryset.annotate(**{
+            name: expression for name, (expression, _) in zip(names, keys)
+        })
+        if values is not None:
+            if len(values) != len(keys):
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(self.get_keyset_filter(
+                names, [descending for _, descending in keys], values,
+                reverse
+            ))
+        queryset = queryset.order_by(*(
+            F(name).desc() if descending != reverse else F(name).asc()
+            for name, (_, descending) in zip(names, keys)
+        ))
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+        self.has_next = has_more or (reverse and values is not None)
+        self.has_previous = has_more if reverse else values is not None
+        self.first_key = self.get_key(results[0], names) if results else None
+        self.last_key = self.get_key(results[-1], names) if results else None
+        return results
+
+    def paginate_ids(self, sources, request):
+        self.cursor_mode = True
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param)
+        )
+        if values is not None and (
+            len(values) != 1 or not isinstance(values[0], int)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        ids = set()
+        for queryset, field in sources:
+            if values is not None:
+                lookup = 'gt' if reverse else 'lt'
+                queryset = queryset.filter(**{f'{field}__{lookup}': values[0]})
+            ids.update(queryset.order_by(
+                field if reverse else f'-{field}'
+            )[:self.page_size + 1])
+        ids = sorted(ids, reverse=not reverse)
+        has_more = len(ids) > self.page_size
+        ids = ids[:self.page_size]
+        if reverse:
+            ids.reverse()
+        self.has_next = has_more or (reverse and values is not None)
+        self.has_previous = has_more if reverse else values is not None
+        self.first_key = ids[:1] or None
+        self.last_key = ids[-1:] or None
+        return ids
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return Response(OrderedDict([
+                ('count', self.page.paginator.count),
+                ('count_exact', self.page.paginator.count_exact),
+                ('next', self.get_next_link()),
+                ('previous', self.get_previous_link()),
+                ('results', data),
+            ]))
+        return Response(OrderedDict([
+            ('count', None),
+            ('count_exact', False),
+            ('next', self.get_cursor_link(self.has_next, self.last_key)),
+            ('previous', self.get_cursor_link(
+                self.has_previous, self.first_key, reverse=True
+            )),
+            ('results', data),
+        ]))
+
+    def get_validator_state(self):
+        if self.cursor_mode:
+            return self.has_next, self.has_previous
+        return self.page.paginator.count, self.page.paginator.count_exact
+
+    def get_sort_keys(self, queryset):
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        keys = []
+        for item in ordering:
+            if isinstance(item, str):
+                keys.append((F(item.lstrip('-')), item.startswith('-')))
+            elif isinstance(item, OrderBy):
+                keys.append((item.expression, item.descending))
+            else:
+                keys.append((item, False))
+        keys.append((F('pk'), False))
+        return keys
+
+    def get_keyset_filter(self, names, descending, values, reverse):
+        condition = Q()
+        for position, name in enumerate(names):
+            lookup = 'lt' if descending[position] != reverse else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[position]})
+            for previous in range(position):
+                term &= Q(**{names[previous]: values[previous]})
+            condition |= term
+        return condition
+
+    def get_key(self, obj, names):
+        return [getattr(obj, name) for name in names]
+
+    def get_cursor_link(self, exists, key, reverse=False):
+        if not exists or key is None:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(key, reverse)
+        )
+
+    def encode_cursor(self, key, reverse):
+        payload = json.dumps({'k': key, 'r': reverse}, default=str)
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return list(payload['k']), bool(payload['r'])
+        except (
+            binascii.Error, ValueError, KeyError, TypeError, UnicodeError
+        ):
+            raise NotFound(self.invalid_cursor_message)
@@ -0,0 +1,70 @@
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+
+from foodgram import constants as c
+
+
+RECIPE_VERSION_KEY = 'recipe-version:{}'
+
+AUTHOR_VERSION_KEY = 'author-version:{}'
+
+REPRESENTATION_KEY = 'recipe-representation:{}:{}:{}:{}'
+
+
+def bump_versions(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def bump_recipe_versions(recipe_ids):
+    transaction.on_commit(partial(bump_versions, [
+        RECIPE_VERSION_KEY.format(recipe_id) for recipe_id in recipe_ids
+    ]))
+
+
+def bump_author_version(author_id):
+    transaction.on_commit(
+        partial(bump_versions, [AUTHOR_VERSION_KEY.format(author_id)])
+    )
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    missing = {
+        key: time.time_ns() for key in keys if key not in versions
+    }
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return versions
+
+
+def get_representation_keys(recipes, base_url):
+    version_keys = {
+        recipe: (
+            RECIPE_VERSION_KEY.format(recipe.pk),
+            AUTHOR_VERSION_KEY.format(recipe.author_id),
+        ) for recipe in recipes
+    }
+    versions = get_versions(list({
+        key for keys in version_keys.values() for key in keys
+    }))
+    return {
+        recipe: REPRESENTATION_KEY.format(
+            recipe.pk, versions[recipe_key], versions[author_key], base_url
+        ) for recipe, (recipe_key, author_key) in version_keys.items()
+    }
+
+
+def get_representations(keys):
+    return cache.get_many(keys)
+
+
+def set_representations(representations):
+    cache.set_many(representations, c.RECIPE_CACHE_TIMEOUT)
@@ -1,13 +1,21 @@
 import re
 
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Manager, prefetch_related_objects
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from api.recipe_cache import (
+    get_representation_keys, get_representations, set_representations
+)
+from api.uploads import Upload, is_upload_token, open_upload
 from foodgram import constants as c
 from recipes.models import (
-    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag,
+    get_contents_lookups
 )
 from users.models import Subscription
 
@@ -15,36 +23,108 @@ from users.models import Subscription
 User = get_user_model()
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request')
+        return {
+            variant: {
+                extension: request.build_absolute_uri(
+                    default_storage.url(name)
+                ) for extension, name in formats.items()
+            }
+            for variant, formats in value.items()
+        }
+
+
+class UploadImageField(Base64ImageField):
+    def to_internal_value(self, data):
+        if isinstance(data, str) and is_upload_token(data):
+            file = open_upload(data, self.context['request'].user)
+            if file is None:
+                raise serializers.ValidationError(
+                    'Недействительный токен загрузки.'
+                )
+            return file
+        return super().to_internal_value(data)
+
+
+class UploadsMixin:
+    def save(self, **kwargs):
+        uploads = [
+            value for value in self.validated_data.values()
+            if isinstance(value, Upload)
+        ]
+        try:
+            instance = super().save(**kwargs)
+        finally:
+            for upload in uploads:
+                upload.close()
+        for upload in uploads:
+            transaction.on_commit(upload.remove)
+        return instance
+
+
 class RecipeShortSerializer(serializers.ModelSerializer):
     image = serializers.ImageField(source='pic', read_only=True)
+    image_variants = ImageVariantsField(source='pic_variants')
     cooking_time = serializers.IntegerField(
         source='time_to_cook', read_only=True
     )
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         extra_kwargs = {
             'name': {'help_text': 'Название рецепта'},
         }
 
 
+class CookRecipeSerializer(RecipeShortSerializer):
+    matched = serializers.IntegerField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeShortSerializer.Meta):
+        fields = RecipeShortSerializer.Meta.fields + ('matched', 'missing')
+
+
+class CookQuerySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=c.COOK_MAX_INGREDIENTS
+    )
+    limit = serializers.IntegerField(
+        min_value=1, max_value=c.COOK_MAX_RESULTS, default=c.PAGE_SIZE
+    )
+
+
+class SimilarQuerySerializer(serializers.Serializer):
+    limit = serializers.IntegerField(
+        min_value=1, max_value=c.SIMILAR_RECIPES_LIMIT,
+        default=c.SIMILAR_RECIPES_LIMIT
+    )
+
+
 class UserSerializer(DjoserUserSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
     avatar = serializers.SerializerMethodField()
+    avatar_variants = ImageVariantsField()
 
     class Meta(DjoserUserSerializer.Meta):
         fields = (
             'email', 'id', 'username', 'first_name', 'last_name',
-            'is_subscribed', 'avatar'
+            'is_subscribed', 'avatar', 'avatar_variants'
         )
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
-        return (
-            request.user.is_authenticated
-            and obj.subscribers.filter(subscriber=request.user).exists()
-        )
+        if not request.user.is_authenticated:
+            return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.subscribers.filter(subscriber=request.user).exists()
 
     def get_avatar(self, obj):
         if obj.avatar:
@@ -54,17 +134,19 @@ class UserSerializer(DjoserUserSerializer):
 
 class SubscriptionSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(source='recipes.count')
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + ('recipes', 'recipes_count',)
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes_qs = obj.recipes.all()
-        if recipes_limit and recipes_limit.isdigit():
-            recipes_qs = recipes_qs[:int(recipes_limit)]
+        recipes_qs = getattr(obj, 'limited_recipes', None)
+        if recipes_qs is None:
+            request = self.context.get('request')
+            recipes_limit = request.query_params.get('recipes_limit')
+            recipes_qs = obj.recipes.all()
+            if recipes_limit and recipes_limit.isdigit():
+                recipes_qs = recipes_qs[:int(recipes_limit)]
         serializer = RecipeShortSerializer(
             recipes_qs, many=True, context=self.context
         )
@@ -96,8 +178,8 @@ class SubscriptionCreateSerializer(serializers.ModelSerializer):
         ).data
 
 
-class UserAvatarSerializer(serializers.ModelSerializer):
-    avatar = Base64ImageField(required=True)
+class UserAvatarSerializer(UploadsMixin, serializers.ModelSerializer):
+    avatar = UploadImageField(required=True)
 
     class Meta:
         model = User
@@ -183,6 +265,12 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class RecipeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, Manager) else data
+        return self.child.represent(list(iterable))
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     author = UserSerializer(read_only=True)
@@ -190,6 +278,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = serializers.ImageField(source='pic', read_only=True)
+    image_variants = ImageVariantsField(source='pic_variants')
     text = serializers.CharField(source='description', read_only=True)
     cooking_time = serializers.IntegerField(
         source='time_to_cook', read_only=True
@@ -199,8 +288,49 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'image_variants', 'text',
+            'cooking_time'
         )
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.represent([instance])[0]
+
+    def represent(self, recipes):
+        request = self.context.get('request')
+        keys = get_representation_keys(
+            recipes, request.build_absolute_uri('/')
+        )
+        representations = get_representations(list(keys.values()))
+        missing = [
+            recipe for recipe in recipes
+            if keys[recipe] not in representations
+        ]
+        if missing:
+            prefetch_related_objects(missing, *get_contents_lookups())
+            fresh = {}
+            for recipe in missing:
+                fresh[keys[recipe]] = super().to_representation(recipe)
+            set_representations(fresh)
+            representations.update(fresh)
+        return [
+            self.overlay(recipe, representations[keys[recipe]])
+            for recipe in recipes
+        ]
+
+    def overlay(self, recipe, representation):
+        representation = dict(representation)
+        representation['is_favorited'] = self.get_is_favorited(recipe)
+        representation['is_in_shopping_cart'] = (
+            self.get_is_in_shopping_cart(recipe)
+        )
+        representation['author'] = dict(
+            representation['author'],
+            is_subscribed=self.fields['author'].get_is_subscribed(
+                recipe.author
+            )
+        )
+        return representation
 
     def get_ingredients(self, obj):
         recipe_ingredients = obj.recipe_ingredients.all()
@@ -210,25 +340,29 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     def get_is_favorited(self, obj):
         request = self.context.get('request')
-        return request.user.is_authenticated and obj.favorites.filter(
-            user=request.user
-        ).exists()
+        if not request.user.is_authenticated:
+            return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return obj.favorites.filter(user=request.user).exists()
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get('request')
-        return request.user.is_authenticated and obj.shopping_cart.filter(
-            user=request.user
-        ).exists()
+        if not request.user.is_authenticated:
+            return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return obj.shopping_cart.filter(user=request.user).exists()
 
 
-class RecipeWriteSerializer(serializers.ModelSerializer):
+class RecipeWriteSerializer(UploadsMixin, serializers.ModelSerializer):
     ingredients = serializers.ListField(
         child=serializers.DictField(), write_only=True
     )
     tags = serializers.PrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True
     )
-    image = Base64ImageField(source='pic')
+    image = UploadImageField(source='pic')
     text = serializers.CharField(source='description')
     cooking_time = serializers.IntegerField(source='time_to_cook')
     author = UserSerializer(read_only=True)
@@ -246,32 +380,39 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Ингредиенты обязательны.')
         if 'tags' not in data or not data['tags']:
             raise serializers.ValidationError('Теги обязательны.')
-        ingredient_ids = [
-            ingredient.get('id') for ingredient in ingredients_data]
-        if len(ingredient_ids) != len(set(ingredient_ids)):
-            raise serializers.ValidationError(
-                'Ингредиенты не могут повторяться.'
-            )
-        seen_ingredients = set()
         for ingredient in ingredients_data:
             ingredient_id = ingredient.get('id')
+            try:
+                ingredient['id'] = int(ingredient_id)
+            except (TypeError, ValueError):
+                raise serializers.ValidationError(
+                    f'Ингредиент с id {ingredient_id} не существует.'
+                )
             amount = ingredient.get('amount')
             try:
-                amount = int(amount)
-            except ValueError:
+                ingredient['amount'] = int(amount)
+            except (TypeError, ValueError):
                 raise serializers.ValidationError(
                     'Количество ингредиента должно быть числом.'
                 )
-            if amount < c.MIN_INGR_AMOUNT:
+            if ingredient['amount'] < c.MIN_INGR_AMOUNT:
                 raise serializers.ValidationError(
                     'Количество ингредиента должно быть >= '
                     f'{c.MIN_INGR_AMOUNT}'
                 )
-            if not Ingredient.objects.filter(id=ingredient_id).exists():
+        ingredient_ids = [ingredient['id'] for ingredient in ingredients_data]
+        if len(ingredient_ids) != len(set(ingredient_ids)):
+            raise serializers.ValidationError(
+                'Ингредиенты не могут повторяться.'
+            )
+        existing_ids = set(Ingredient.objects.filter(
+            id__in=ingredient_ids
+        ).values_list('id', flat=True))
+        for ingredient_id in ingredient_ids:
+            if ingredient_id not in existing_ids:
                 raise serializers.ValidationError(
                     f'Ингредиент с id {ingredient_id} не существует.'
                 )
-            seen_ingredients.add(ingredient_id)
         tags = data.get('tags')
         if len(tags) != len(set(tags)):
             raise serializers.ValidationError('Теги не могут повторяться.')
@@ -295,34 +436,67 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         serializer = RecipeReadSerializer(instance, context=self.context)
         return serializer.data
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         request = self.context.get('request')
         recipe = Recipe.objects.create(author=request.user, **validated_data)
         recipe.tags.set(tags)
-        self._create_recipe_ingredients(recipe, ingredients_data)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount']
+            ) for ingredient in ingredients_data
+        )
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         request = self.context.get('request')
         instance.author = request.user
         instance.tags.set(tags)
-        instance.recipe_ingredients.all().delete()
-        self._create_recipe_ingredients(instance, ingredients_data)
+        self._update_recipe_ingredients(instance, ingredients_data)
         return super().update(instance, validated_data)
 
-    def _create_recipe_ingredients(self, recipe, ingredients_data):
-        recipe_ingredients = [
+    def _update_recipe_ingredients(self, recipe, ingredients_data):
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients_data
+        }
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
+            ).only('recipe_id', 'ingredient_id', 'amount')
+        }
+        removed = [
+            recipe_ingredient.pk
+            for ingredient_id, recipe_ingredient in current.items()
+            if ingredient_id not in amounts
+        ]
+        changed = []
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        added = [
             RecipeIngredient(
-                recipe=recipe,
-                ingredient_id=ingredient.get('id'),
-                amount=ingredient.get('amount')
-            ) for ingredient in ingredients_data
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
         ]
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).bulk_delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
 
 
 class RecipeActionSerializer(serializers.ModelSerializer):
@@ -359,3 +533,11 @@ class ShoppingCartSerializer(RecipeActionSerializer):
 class FavoriteSerializer(RecipeActionSerializer):
     class Meta(RecipeActionSerializer.Meta):
         model = Favorite
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=c.RECIPE_BATCH_MAX_SIZE
+    )
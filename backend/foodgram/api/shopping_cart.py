@@ -0,0 +1,119 @@
+import csv
+import json
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+
+from foodgram import constants as c
+
+
+class DownloadRenderer(BaseRenderer):
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode(
+            self.charset or 'utf-8'
+        )
+
+
+class TextRenderer(DownloadRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(DownloadRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class JSONDownloadRenderer(DownloadRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+
+class PDFRenderer(DownloadRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def format_line(item):
+    return (f'{item["ingredient__name"]} '
+            f'({item["ingredient__measurement_unit"]}) - '
+            f'{item["total_amount"]}')
+
+
+def iter_txt(ingredients):
+    separator = ''
+    for item in ingredients:
+        yield f'{separator}{format_line(item)}'
+        separator = '\n'
+
+
+def iter_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for item in ingredients:
+        yield writer.writerow((
+            item['ingredient__name'], item['ingredient__measurement_unit'],
+            item['total_amount']
+        ))
+
+
+def iter_json(ingredients):
+    separator = '['
+    for item in ingredients:
+        yield separator + json.dumps({
+            'name': item['ingredient__name'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+            'amount': item['total_amount'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']' if separator == ',' else '[]'
+
+
+def pdf_available():
+    try:
+        import reportlab  # noqa: F401
+    except ImportError:
+        return False
+    return os.path.exists(settings.PDF_FONT_PATH)
+
+
+def write_pdf(ingredients):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    pdfmetrics.registerFont(TTFont('ShoppingCartFont', settings.PDF_FONT_PATH))
+    file = SpooledTemporaryFile(max_size=c.PDF_SPOOL_MAX_SIZE)
+    pdf = canvas.Canvas(file, pagesize=A4)
+    width, height = A4
+    margin = c.PDF_MARGIN
+    y = height - margin
+    pdf.setFont('ShoppingCartFont', c.PDF_FONT_SIZE)
+    for item in ingredients:
+        if y < margin:
+            pdf.showPage()
+            pdf.setFont('ShoppingCartFont', c.PDF_FONT_SIZE)
+            y = height - margin
+        pdf.drawString(margin, y, format_line(item))
+        y -= c.PDF_LINE_HEIGHT
+    pdf.save()
+    file.seek(0)
+    return file
+
+
+STREAMS = {
+    'txt': iter_txt,
+    'csv': iter_csv,
+    'json': iter_json,
+}
@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api.counts import (
+    COUNTED_MODELS, invalidate_counts, invalidate_instance_counts
+)
+from api.recipe_cache import bump_author_version, bump_recipe_versions
+from foodgram.images import variants_ready
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+
+User = get_user_model()
+
+
+@receiver(post_save)
+def invalidate_counts_on_create(sender, instance, created, **kwargs):
+    if created and sender in COUNTED_MODELS:
+        invalidate_instance_counts(instance)
+
+
+@receiver(post_delete)
+def invalidate_counts_on_delete(sender, instance, **kwargs):
+    if sender in COUNTED_MODELS:
+        invalidate_instance_counts(instance)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_counts_on_tags_change(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_counts(sender)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    bump_recipe_versions([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_recipe_ingredient(sender, instance, **kwargs):
+    bump_recipe_versions([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_recipe_versions([instance.pk])
+    elif pk_set:
+        bump_recipe_versions(pk_set)
+    else:
+        bump_recipe_versions(
+            instance.recipes.values_list('id', flat=True)
+        )
+
+
+@receiver(post_save, sender=Tag)
+def invalidate_tag_recipes(sender, instance, created, **kwargs):
+    if not created:
+        bump_recipe_versions(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        bump_recipe_versions(
+            instance.recipe_ingredients.values_list('recipe_id', flat=True)
+        )
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(sender, instance, created, **kwargs):
+    if not created and instance.profile_changed():
+        bump_author_version(instance.pk)
+
+
+@receiver(variants_ready, sender=Recipe)
+def invalidate_recipe_variants(sender, pk, **kwargs):
+    bump_recipe_versions([pk])
+
+
+@receiver(variants_ready, sender=User)
+def invalidate_author_variants(sender, pk, **kwargs):
+    bump_author_version(pk)
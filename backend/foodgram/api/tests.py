@@ -0,0 +1,1218 @@
+import base64
+import json
+import os
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.benchmark import check_budgets, load_baselines, run_benchmark
+from api.counts import estimate_count
+from api.recipe_cache import AUTHOR_VERSION_KEY, RECIPE_VERSION_KEY
+from api.shopping_cart import pdf_available
+from foodgram import constants as c
+from foodgram.images import collect_images
+from recipes.clicks import click_counter
+from recipes.cook_index import cook_index
+from recipes.models import (
+    Favorite, FeedEntry, Ingredient, Recipe, RecipeClicks, RecipeIngredient,
+    ShoppingCart, Tag
+)
+from recipes.service import (
+    decode_short_link, encode_short_link, resolve_stored_short_link
+)
+from recipes.trending import refresh_trending
+from users.models import Subscription
+
+
+User = get_user_model()
+
+RECIPES_COUNT = 12
+
+RECIPE_LIST_MAX_QUERIES = 5
+
+
+class RecipeAPITestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass',
+            first_name='Reader', last_name='Reader'
+        )
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass',
+            first_name='Author', last_name='Author'
+        )
+        Subscription.objects.create(subscriber=cls.user, author=cls.author)
+        tags = [
+            Tag.objects.create(name=f'Тег {i}', slug=f'tag-{i}')
+            for i in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г'
+            ) for i in range(4)
+        ]
+        for i in range(RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {i}',
+                description='Описание', time_to_cook=10
+            )
+            recipe.tags.set(tags)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=i + 1)
+                for ingredient in ingredients
+            )
+            if i % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if i % 3:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class RecipeListQueriesTest(RecipeAPITestCase):
+    def get_list(self, limit):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return response, len(context.captured_queries)
+
+    def test_recipe_list_queries_do_not_grow_with_page_size(self):
+        _, small_page_queries = self.get_list(2)
+        _, full_page_queries = self.get_list(RECIPES_COUNT)
+        self.assertEqual(small_page_queries, full_page_queries)
+        self.assertLessEqual(full_page_queries, RECIPE_LIST_MAX_QUERIES)
+
+    def test_recipe_list_user_flags(self):
+        response, _ = self.get_list(RECIPES_COUNT)
+        for item in response.data['results']:
+            recipe = Recipe.objects.get(pk=item['id'])
+            self.assertEqual(
+                item['is_favorited'],
+                Favorite.objects.filter(user=self.user, recipe=recipe).exists()
+            )
+            self.assertEqual(
+                item['is_in_shopping_cart'],
+                ShoppingCart.objects.filter(
+                    user=self.user, recipe=recipe
+                ).exists()
+            )
+            self.assertTrue(item['author']['is_subscribed'])
+            self.assertEqual(len(item['ingredients']), 4)
+            self.assertEqual(len(item['tags']), 3)
+
+    def test_recipe_detail_queries(self):
+        recipe = Recipe.objects.first()
+        with self.assertNumQueries(RECIPE_LIST_MAX_QUERIES - 1):
+            response = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_anonymous_recipe_list(self):
+        response = APIClient().get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        for item in response.data['results']:
+            self.assertFalse(item['is_favorited'])
+            self.assertFalse(item['is_in_shopping_cart'])
+            self.assertFalse(item['author']['is_subscribed'])
+
+
+class CursorPaginationTest(RecipeAPITestCase):
+    def test_cursor_walk_matches_page_order(self):
+        expected = [
+            item['id'] for item in self.client.get(
+                '/api/recipes/', {'limit': RECIPES_COUNT}
+            ).data['results']
+        ]
+        seen = []
+        url = '/api/recipes/?cursor=&limit=5'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('count', response.data)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+    def test_cursor_previous_link(self):
+        first = self.client.get('/api/recipes/?cursor=&limit=5')
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in back.data['results']],
+            [item['id'] for item in first.data['results']]
+        )
+
+    def test_cursor_page_queries_do_not_depend_on_depth(self):
+        first = self.client.get('/api/recipes/?cursor=&limit=2')
+        cache.clear()
+        with CaptureQueriesContext(connection) as first_page:
+            self.client.get('/api/recipes/?cursor=&limit=2')
+        url = first.data['next']
+        for _ in range(3):
+            url = self.client.get(url).data['next']
+        cache.clear()
+        with CaptureQueriesContext(connection) as deep_page:
+            self.client.get(url)
+        self.assertEqual(
+            len(first_page.captured_queries),
+            len(deep_page.captured_queries)
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/', {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_subscriptions_cursor(self):
+        response = self.client.get('/api/users/subscriptions/?cursor=')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [self.author.id]
+        )
+
+
+class CachedCountTest(RecipeAPITestCase):
+    def test_count_is_cached_until_recipes_change(self):
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.data['count'], RECIPES_COUNT)
+        self.assertTrue(response.data['count_exact'])
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/recipes/')
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in context.captured_queries
+        ))
+        Recipe.objects.create(
+            author=self.author, name='Новый рецепт',
+            description='Описание', time_to_cook=5
+        )
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.data['count'], RECIPES_COUNT + 1)
+
+    def test_filtered_count_follows_favorites(self):
+        params = {'is_favorited': 1}
+        favorited = Favorite.objects.filter(user=self.user).count()
+        response = self.client.get('/api/recipes/', params)
+        self.assertEqual(response.data['count'], favorited)
+        Favorite.objects.filter(user=self.user).first().delete()
+        response = self.client.get('/api/recipes/', params)
+        self.assertEqual(response.data['count'], favorited - 1)
+
+    def count_queries(self, params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/', params)
+        return response.data['count'], sum(
+            'COUNT(' in query['sql'] for query in context.captured_queries
+        )
+
+    def test_favorites_only_invalidate_their_owner_counts(self):
+        favorited = {'is_favorited': 1}
+        for params in ({}, favorited):
+            self.client.get('/api/recipes/', params)
+        recipe = Recipe.objects.exclude(favorites__user=self.user).first()
+        Favorite.objects.create(user=self.author, recipe=recipe)
+        self.assertEqual(self.count_queries({})[1], 0)
+        count, queries = self.count_queries(favorited)
+        self.assertEqual(queries, 0)
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        self.assertEqual(self.count_queries({})[1], 0)
+        self.assertEqual(self.count_queries(favorited), (count + 1, 1))
+
+    def test_filtered_estimate_only_for_checked_large_sets(self):
+        queryset = Recipe.objects.filter(author=self.author)
+        with mock.patch(
+            'api.counts.get_plan_estimate', return_value=10 ** 6
+        ) as get_plan_estimate:
+            with mock.patch.object(
+                c, 'COUNT_ESTIMATE_THRESHOLD', RECIPES_COUNT
+            ):
+                self.assertEqual(
+                    estimate_count(queryset), (RECIPES_COUNT, True)
+                )
+            get_plan_estimate.assert_not_called()
+            with mock.patch.object(
+                c, 'COUNT_ESTIMATE_THRESHOLD', RECIPES_COUNT - 1
+            ):
+                self.assertEqual(estimate_count(queryset), (10 ** 6, False))
+
+
+class RecipeRepresentationCacheTest(RecipeAPITestCase):
+    def test_cached_page_skips_contents_queries(self):
+        self.client.get('/api/recipes/')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any(
+            'recipes_recipeingredient' in query['sql']
+            for query in context.captured_queries
+        ))
+
+    def test_user_flags_are_not_shared_between_viewers(self):
+        recipe = Recipe.objects.filter(favorites__user=self.user).first()
+        response = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertTrue(response.data['is_favorited'])
+        self.assertTrue(response.data['author']['is_subscribed'])
+        response = APIClient().get(f'/api/recipes/{recipe.id}/')
+        self.assertFalse(response.data['is_favorited'])
+        self.assertFalse(response.data['author']['is_subscribed'])
+
+    def test_ingredient_and_author_changes_invalidate(self):
+        recipe = Recipe.objects.first()
+        self.client.get(f'/api/recipes/{recipe.id}/')
+        recipe_ingredient = recipe.recipe_ingredients.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe_ingredient.amount = 999
+            recipe_ingredient.save()
+            self.author.first_name = 'Переименован'
+            self.author.save()
+        response = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertIn(
+            999, [item['amount'] for item in response.data['ingredients']]
+        )
+        self.assertEqual(response.data['author']['first_name'], 'Переименован')
+
+    def test_only_profile_changes_touch_author_recipes(self):
+        recipe = Recipe.objects.first()
+        updated_at = recipe.updated_at
+        key = AUTHOR_VERSION_KEY.format(self.author.id)
+        self.client.get(f'/api/recipes/{recipe.id}/')
+        version = cache.get(key)
+        author = User.objects.get(pk=self.author.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            author.set_password('new-password')
+            author.save()
+            author.last_login = author.date_joined
+            author.save(update_fields=['last_login'])
+        self.assertEqual(cache.get(key), version)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.updated_at, updated_at)
+        with self.captureOnCommitCallbacks(execute=True):
+            author.email = 'renamed@example.com'
+            author.save()
+        self.assertNotEqual(cache.get(key), version)
+        recipe.refresh_from_db()
+        self.assertGreater(recipe.updated_at, updated_at)
+
+    def test_versions_are_bumped_after_commit(self):
+        recipe = Recipe.objects.first()
+        self.client.get(f'/api/recipes/{recipe.id}/')
+        key = RECIPE_VERSION_KEY.format(recipe.id)
+        version = cache.get(key)
+        with self.captureOnCommitCallbacks() as callbacks:
+            recipe.save()
+        self.assertEqual(cache.get(key), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(cache.get(key), version)
+
+
+class IngredientSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('Сахар', 'сахарная пудра', 'Ванильный сахар', 'Соль'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_prefix_matches_before_contains_matches(self):
+        self.client.get('/api/ingredients/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/ingredients/', {'name': 'САХ'})
+        self.assertEqual(
+            [item['name'] for item in response.json()],
+            ['Сахар', 'сахарная пудра', 'Ванильный сахар']
+        )
+
+    def test_index_follows_ingredient_changes(self):
+        self.client.get('/api/ingredients/', {'name': 'со'})
+        Ingredient.objects.create(name='Соус', measurement_unit='мл')
+        response = self.client.get('/api/ingredients/', {'name': 'со'})
+        self.assertEqual(
+            [item['name'] for item in response.json()], ['Соль', 'Соус']
+        )
+
+
+class ReferenceDataTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_snapshot_and_revalidation(self):
+        response = self.client.get('/api/reference-data/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        data = response.json()
+        self.assertEqual(data['tags'][0]['slug'], 'breakfast')
+        self.assertEqual(data['ingredients'][0]['name'], 'Соль')
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                '/api/reference-data/', HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+        Tag.objects.create(name='Обед', slug='lunch')
+        response = self.client.get(
+            '/api/reference-data/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_hashed_snapshot_is_immutable(self):
+        location = self.client.get('/api/reference-data/')['Content-Location']
+        response = self.client.get(location, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get('/api/reference-data/outdated/')
+        self.assertRedirects(
+            response, location, fetch_redirect_response=False
+        )
+
+
+class ConditionalRecipeTest(RecipeAPITestCase):
+    def test_detail_not_modified_until_favorite_changes(self):
+        recipe = Recipe.objects.exclude(favorites__user=self.user).first()
+        url = f'/api/recipes/{recipe.id}/'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+
+    def test_list_not_modified_until_ingredients_change(self):
+        etag = self.client.get('/api/recipes/')['ETag']
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                '/api/recipes/', HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any(
+            'recipes_recipeingredient' in query['sql']
+            for query in context.captured_queries
+        ))
+        recipe_ingredient = RecipeIngredient.objects.filter(
+            recipe__name='Рецепт 0'
+        ).first()
+        recipe_ingredient.amount = 500
+        recipe_ingredient.save()
+        response = self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_anonymous_detail_last_modified(self):
+        recipe = Recipe.objects.first()
+        url = f'/api/recipes/{recipe.id}/'
+        client = APIClient()
+        last_modified = client.get(url)['Last-Modified']
+        response = client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn(
+            'Last-Modified', self.client.get(url)
+        )
+
+
+class ShoppingCartDownloadTest(RecipeAPITestCase):
+    url = '/api/recipes/download_shopping_cart/'
+
+    def get_content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_text_is_default(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('shopping_cart.txt', response['Content-Disposition'])
+        self.assertEqual(
+            self.get_content(response).split('\n'),
+            [f'Ингредиент {i} (г) - 56' for i in range(4)]
+        )
+
+    def test_csv_and_json_formats(self):
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertIn('shopping_cart.csv', response['Content-Disposition'])
+        rows = self.get_content(response).splitlines()
+        self.assertEqual(rows[0], 'name,measurement_unit,amount')
+        self.assertEqual(rows[1], 'Ингредиент 0,г,56')
+        response = self.client.get(
+            self.url, HTTP_ACCEPT='application/json'
+        )
+        self.assertEqual(json.loads(self.get_content(response))[3], {
+            'name': 'Ингредиент 3', 'measurement_unit': 'г', 'amount': 56
+        })
+
+    def test_empty_cart(self):
+        ShoppingCart.objects.filter(user=self.user).delete()
+        response = self.client.get(self.url, {'format': 'json'})
+        self.assertEqual(json.loads(self.get_content(response)), [])
+        response = self.client.get(self.url)
+        self.assertEqual(self.get_content(response), '')
+
+    def test_pdf_format(self):
+        response = self.client.get(self.url, {'format': 'pdf'})
+        if not pdf_available():
+            self.assertEqual(response.status_code, 503)
+            return
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(
+            b''.join(response.streaming_content).startswith(b'%PDF')
+        )
+
+    def test_pdf_unavailable(self):
+        with mock.patch('api.views.pdf_available', return_value=False):
+            response = self.client.get(self.url, {'format': 'pdf'})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('errors', response.json())
+
+    def test_anonymous_forbidden(self):
+        response = APIClient().get(self.url)
+        self.assertEqual(response.status_code, 401)
+
+
+class RecipeBatchTest(RecipeAPITestCase):
+    def post_batch(self, url, recipe_ids, method='post'):
+        return getattr(self.client, method)(
+            url, {'recipes': recipe_ids}, format='json'
+        )
+
+    def test_favorite_batch(self):
+        url = '/api/recipes/favorite/batch/'
+        favorited = Recipe.objects.filter(favorites__user=self.user).first()
+        new = list(
+            Recipe.objects.exclude(favorites__user=self.user)
+            .values_list('id', flat=True)[:2]
+        )
+        response = self.post_batch(url, [*new, favorited.id, 0, new[0]])
+        self.assertEqual(response.status_code, 400)
+        missing = Recipe.objects.order_by('-id').first().id + 1
+        response = self.post_batch(url, [*new, favorited.id, missing])
+        self.assertEqual(
+            [item['status'] for item in response.data['results']],
+            [201, 201, 400, 404]
+        )
+        recipe = Recipe.objects.get(id=new[0])
+        self.assertEqual(recipe.favorites_count, 1)
+        response = self.post_batch(url, [new[0], missing], method='delete')
+        self.assertEqual(
+            [item['status'] for item in response.data['results']],
+            [204, 404]
+        )
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+        self.assertFalse(
+            Favorite.objects.filter(user=self.user, recipe=recipe).exists()
+        )
+
+    def test_shopping_cart_batch_updates_totals(self):
+        url = '/api/recipes/shopping_cart/batch/'
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        self.post_batch(url, recipe_ids, method='delete')
+        self.assertFalse(self.user.shopping_cart_ingredients.exists())
+        self.post_batch(url, recipe_ids[:2])
+        self.assertEqual(
+            set(self.user.shopping_cart_ingredients.values_list(
+                'amount', flat=True
+            )),
+            {sum(
+                RecipeIngredient.objects.filter(
+                    recipe_id__in=recipe_ids[:2],
+                    ingredient__name='Ингредиент 0'
+                ).values_list('amount', flat=True)
+            )}
+        )
+
+    def test_batch_queries_do_not_grow(self):
+        url = '/api/recipes/favorite/batch/'
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        Favorite.objects.filter(user=self.user).bulk_delete()
+        queries = []
+        for batch in (recipe_ids[:2], recipe_ids[2:]):
+            with CaptureQueriesContext(connection) as context:
+                self.post_batch(url, batch)
+            queries.append(len(context.captured_queries))
+        self.assertEqual(queries[0], queries[1])
+        self.assertEqual(
+            Favorite.objects.filter(user=self.user).count(), RECIPES_COUNT
+        )
+
+
+class RecipeUpdateTest(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.author)
+        self.recipe = Recipe.objects.get(name='Рецепт 1')
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def get_payload(self, amounts=()):
+        ingredients = {
+            ingredient_id: amount
+            for ingredient_id, amount in self.recipe.recipe_ingredients
+            .values_list('ingredient_id', 'amount')
+        }
+        ingredients.update(amounts)
+        return {
+            'name': 'Новое название',
+            'tags': list(self.recipe.tags.values_list('id', flat=True)),
+            'ingredients': [
+                {'id': ingredient_id, 'amount': amount}
+                for ingredient_id, amount in ingredients.items()
+                if amount
+            ],
+        }
+
+    def get_totals(self):
+        return dict(self.user.shopping_cart_ingredients.values_list(
+            'ingredient_id', 'amount'
+        ))
+
+    def test_title_only_update_keeps_ingredient_rows(self):
+        payload = self.get_payload()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'Новое название')
+        sql = [query['sql'] for query in context.captured_queries]
+        self.assertEqual(
+            sum('FROM "recipes_ingredient"' in query for query in sql), 1
+        )
+        for table in ('recipes_recipeingredient', 'recipes_recipe_tags'):
+            self.assertFalse([
+                query for query in sql
+                if query.startswith(('INSERT', 'UPDATE', 'DELETE'))
+                and f'"{table}"' in query.split('WHERE')[0]
+            ])
+
+    def test_changed_ingredients_update_shopping_totals(self):
+        first, second, third, fourth = Ingredient.objects.order_by('pk')
+        totals = self.get_totals()
+        added = Ingredient.objects.create(name='Новый', measurement_unit='г')
+        payload = self.get_payload({first.id: 10, second.id: 0, added.id: 5})
+        rows = set(self.recipe.recipe_ingredients.filter(
+            ingredient=third
+        ).values_list('pk', 'amount'))
+        response = self.client.patch(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            dict(self.recipe.recipe_ingredients.values_list(
+                'ingredient_id', 'amount'
+            )),
+            {first.id: 10, third.id: 2, fourth.id: 2, added.id: 5}
+        )
+        self.assertEqual(rows, set(self.recipe.recipe_ingredients.filter(
+            ingredient=third
+        ).values_list('pk', 'amount')))
+        totals[first.id] += 8
+        totals[second.id] -= 2
+        totals[added.id] = 5
+        self.assertEqual(self.get_totals(), totals)
+
+    def test_missing_ingredient_is_rejected(self):
+        payload = self.get_payload()
+        payload['ingredients'].append({'id': 0, 'amount': 1})
+        response = self.client.patch(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(
+            'Ингредиент с id 0 не существует.',
+            response.data['non_field_errors']
+        )
+
+    def test_missing_amount_is_rejected(self):
+        payload = self.get_payload()
+        del payload['ingredients'][0]['amount']
+        response = self.client.patch(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(
+            'Количество ингредиента должно быть числом.',
+            response.data['non_field_errors']
+        )
+
+
+class SubscriptionsPageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass',
+            first_name='Reader', last_name='Reader'
+        )
+        for i in range(6):
+            author = User.objects.create_user(
+                username=f'author{i}', email=f'author{i}@example.com',
+                password='pass', first_name='Author', last_name=f'{i}'
+            )
+            Subscription.objects.create(subscriber=cls.user, author=author)
+            for j in range(i):
+                Recipe.objects.create(
+                    author=author, name=f'Рецепт {i}-{j}',
+                    description='Описание', time_to_cook=10
+                )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_page(self, limit):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/users/subscriptions/', {
+                'limit': limit, 'recipes_limit': 2
+            })
+        return response, len(context.captured_queries)
+
+    def test_recipes_limited_per_author(self):
+        response, _ = self.get_page(10)
+        for item in response.data['results']:
+            names = [recipe['name'] for recipe in item['recipes']]
+            author_number = int(item['last_name'])
+            self.assertEqual(names, [
+                f'Рецепт {author_number}-{j}'
+                for j in range(min(author_number, 2))
+            ])
+            self.assertEqual(item['recipes_count'], author_number)
+            self.assertTrue(item['is_subscribed'])
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        self.get_page(2)
+        _, small = self.get_page(2)
+        _, large = self.get_page(6)
+        self.assertEqual(small, large)
+
+
+class FeedTest(RecipeAPITestCase):
+    url = '/api/recipes/feed/'
+
+    def get_feed_ids(self, limit=5):
+        ids = []
+        url = f'{self.url}?limit={limit}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_feed_is_fanned_out_and_paginated(self):
+        expected = list(
+            self.author.recipes.order_by('-id').values_list('id', flat=True)
+        )
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user).count(), len(expected)
+        )
+        self.assertEqual(self.get_feed_ids(), expected)
+        response = self.client.get(self.url, {'limit': 5})
+        response = self.client.get(response.data['next'])
+        previous = self.client.get(response.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in previous.data['results']], expected[:5]
+        )
+
+    def test_subscription_changes_prune_and_backfill(self):
+        Subscription.objects.filter(subscriber=self.user).delete()
+        self.assertEqual(self.get_feed_ids(), [])
+        Subscription.objects.create(subscriber=self.user, author=self.author)
+        self.assertEqual(len(self.get_feed_ids()), RECIPES_COUNT)
+
+    def test_large_authors_are_merged_on_read(self):
+        expected = self.get_feed_ids()
+        with mock.patch.object(c, 'FEED_FANOUT_MAX_SUBSCRIBERS', 0):
+            FeedEntry.objects.all().delete()
+            recipe = Recipe.objects.create(
+                author=self.author, name='Новый рецепт',
+                description='Описание', time_to_cook=10
+            )
+            self.assertFalse(FeedEntry.objects.exists())
+            self.assertEqual(self.get_feed_ids(), [recipe.id, *expected])
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        queries = []
+        for limit in (2, 10):
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                self.client.get(self.url, {'limit': limit})
+            queries.append(len(context.captured_queries))
+        self.assertEqual(queries[0], queries[1])
+
+
+class RecipeSearchTest(RecipeAPITestCase):
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data['results']]
+
+    def test_search_ranks_name_above_description(self):
+        author = self.author
+        Recipe.objects.create(
+            author=author, name='Борщ', description='Свекольный суп',
+            time_to_cook=60
+        )
+        Recipe.objects.create(
+            author=author, name='Салат', description='Подаётся к борщу',
+            time_to_cook=10
+        )
+        self.assertEqual(self.search('борщ'), ['Борщ', 'Салат'])
+        response = self.client.get(
+            '/api/recipes/', {'search': 'борщ', 'cursor': '', 'limit': 1}
+        )
+        response = self.client.get(response.data['next'])
+        self.assertEqual(
+            [item['name'] for item in response.data['results']], ['Салат']
+        )
+        self.assertEqual(self.search('СВЕКОЛЬНЫЙ'), ['Борщ'])
+        self.assertEqual(self.search('?!'), [])
+
+    def test_index_follows_recipe_writes(self):
+        recipe = Recipe.objects.create(
+            author=self.author, name='Окрошка', description='Квас',
+            time_to_cook=15
+        )
+        recipe.name = 'Холодник'
+        recipe.save()
+        self.assertEqual(self.search('окрошка'), [])
+        self.assertEqual(self.search('холодник'), ['Холодник'])
+        recipe.delete()
+        self.assertEqual(self.search('холодник'), [])
+
+
+class TrendingOrderingTest(RecipeAPITestCase):
+    @mock.patch.object(c, 'TRENDING_SETTLE_DELAY', 0)
+    def test_trending_ordering(self):
+        refresh_trending()
+        expected = list(
+            Recipe.objects.order_by('-trending_score', 'pk')
+            .values_list('name', flat=True)[:3]
+        )
+        self.assertEqual(expected, ['Рецепт 11', 'Рецепт 7', 'Рецепт 5'])
+        response = self.client.get(
+            '/api/recipes/', {'ordering': 'trending', 'limit': 3}
+        )
+        self.assertEqual(
+            [item['name'] for item in response.data['results']], expected
+        )
+        response = self.client.get(
+            '/api/recipes/', {'ordering': 'popular'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class WhatToCookTest(RecipeAPITestCase):
+    url = '/api/recipes/what_to_cook/'
+
+    def setUp(self):
+        super().setUp()
+        cook_index.reset()
+        self.ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+
+    def cook(self, ingredient_ids, limit=3):
+        response = self.client.get(self.url, {
+            'ingredients': ','.join(map(str, ingredient_ids)), 'limit': limit
+        })
+        self.assertEqual(response.status_code, 200)
+        return [
+            (item['name'], item['matched'], item['missing'])
+            for item in response.data
+        ]
+
+    def test_ranked_by_missing_and_incrementally_updated(self):
+        results = self.cook(self.ingredient_ids[:2])
+        self.assertEqual(len(results), 3)
+        self.assertEqual({result[1:] for result in results}, {(2, 2)})
+        recipe = Recipe.objects.create(
+            author=self.author, name='Простой рецепт',
+            description='Описание', time_to_cook=5
+        )
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=self.ingredient_ids[0], amount=1
+            )
+        ])
+        self.assertEqual(
+            self.cook(self.ingredient_ids[:2])[0], ('Простой рецепт', 1, 0)
+        )
+        recipe.delete()
+        self.assertNotIn(
+            'Простой рецепт',
+            [name for name, _, _ in self.cook(self.ingredient_ids[:2])]
+        )
+
+    def test_bitmaps_and_posting_lists_agree(self):
+        results = self.cook(self.ingredient_ids[:3], limit=5)
+        self.assertTrue(cook_index.bitmaps)
+        cook_index.reset()
+        with mock.patch.object(c, 'COOK_INDEX_BITMAP_RATIO', 1):
+            self.assertEqual(
+                self.cook(self.ingredient_ids[:3], limit=5), results
+            )
+        self.assertFalse(cook_index.bitmaps)
+
+    def test_invalid_ingredients(self):
+        response = self.client.get(self.url, {'ingredients': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 400)
+
+
+class SimilarRecipesTest(RecipeAPITestCase):
+    def test_similar_recipes_from_co_interactions(self):
+        recipes = list(Recipe.objects.order_by('id'))
+        readers = [
+            User.objects.create_user(
+                username=f'similar{i}', email=f'similar{i}@example.com',
+                password='pass'
+            ) for i in range(3)
+        ]
+        for reader in readers:
+            Favorite.objects.create(user=reader, recipe=recipes[0])
+            Favorite.objects.create(user=reader, recipe=recipes[1])
+        ShoppingCart.objects.create(user=readers[0], recipe=recipes[2])
+        call_command('build_recommendations', stdout=StringIO())
+        url = f'/api/recipes/{recipes[0].id}/similar/'
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual(response.data[0]['id'], recipes[1].id)
+        response = self.client.get(url, {'limit': 1})
+        self.assertEqual(len(response.data), 1)
+        missing = Recipe.objects.order_by('-id').first().id + 1
+        response = self.client.get(f'/api/recipes/{missing}/similar/')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(IMAGE_VARIANTS_ASYNC=False)
+class MediaTestCase(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(media_root.name, 'media'),
+            UPLOAD_ROOT=os.path.join(media_root.name, 'uploads')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def get_image_bytes(self):
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        Image.new('RGBA', (1600, 800), (200, 100, 50, 128)).save(
+            buffer, 'PNG', exif=exif
+        )
+        return buffer.getvalue()
+
+    def get_image(self):
+        encoded = base64.b64encode(self.get_image_bytes()).decode()
+        return f'data:image/png;base64,{encoded}'
+
+
+class ImageVariantsTest(MediaTestCase):
+
+    def test_avatar_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                '/api/users/me/avatar/', {'avatar': self.get_image()},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        variants = self.client.get('/api/users/me/').data['avatar_variants']
+        self.assertEqual(set(variants), {'thumbnail', 'card', 'full'})
+        names = self.user.avatar_variants
+        for variant, size in c.IMAGE_VARIANTS:
+            self.assertEqual(set(variants[variant]), {'webp', 'jpeg'})
+            for extension, image_format in (('webp', 'WEBP'),
+                                            ('jpeg', 'JPEG')):
+                with default_storage.open(names[variant][extension]) as file:
+                    image = Image.open(file)
+                    self.assertEqual(image.format, image_format)
+                    self.assertEqual(image.size, (size, size // 2))
+                    self.assertFalse(image.getexif())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete('/api/users/me/avatar/')
+        self.assertIsNone(
+            self.client.get('/api/users/me/').data['avatar_variants']
+        )
+        self.assertEqual(collect_images(grace=0), 1)
+        self.assertFalse(
+            default_storage.exists(names['thumbnail']['webp'])
+        )
+
+    def test_recipe_variants_in_list(self):
+        recipe = Recipe.objects.order_by('pk').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.pic = ContentFile(self.get_image_bytes(), name='pic.png')
+            recipe.save()
+        response = self.client.get(
+            '/api/recipes/', {'author': self.author.id, 'limit': 100}
+        )
+        variants = {
+            item['id']: item['image_variants']
+            for item in response.data['results']
+        }
+        self.assertTrue(
+            variants[recipe.id]['thumbnail']['webp'].endswith('.webp')
+        )
+        self.assertEqual(
+            sum(value is not None for value in variants.values()), 1
+        )
+
+    def test_variants_change_recipe_etag(self):
+        recipe = Recipe.objects.order_by('pk').first()
+        url = f'/api/recipes/{recipe.id}/'
+        with self.captureOnCommitCallbacks() as callbacks:
+            recipe.pic = ContentFile(self.get_image_bytes(), name='pic.png')
+            recipe.save()
+        response = self.client.get(url)
+        self.assertIsNone(response.data['image_variants'])
+        for callback in callbacks:
+            callback()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.data['image_variants'])
+
+
+class ContentAddressedImagesTest(MediaTestCase):
+    def set_pic(self, recipe):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.pic = ContentFile(self.get_image_bytes(), name='pic.png')
+            recipe.save()
+        recipe.refresh_from_db()
+        return recipe.pic.name
+
+    def test_identical_uploads_share_one_file(self):
+        first, second = Recipe.objects.order_by('pk')[:2]
+        name = self.set_pic(first)
+        self.assertEqual(self.set_pic(second), name)
+        self.assertRegex(name, r'^recipe_pics/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        variants = first.pic_variants
+        with mock.patch('foodgram.images.make_variants') as make_variants:
+            self.assertEqual(self.set_pic(first), name)
+        make_variants.assert_not_called()
+        first.refresh_from_db()
+        self.assertEqual(first.pic_variants, variants)
+        thumbnail = variants['thumbnail']['webp']
+        first.delete()
+        self.assertEqual(collect_images(grace=0), 0)
+        self.assertTrue(default_storage.exists(name))
+        second.delete()
+        self.assertEqual(collect_images(), 0)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(collect_images(grace=0), 1)
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(thumbnail))
+
+    def test_reupload_protects_file_from_collection(self):
+        first, second = Recipe.objects.order_by('pk')[:2]
+        name = self.set_pic(first)
+        first.delete()
+        os.utime(default_storage.path(name), (0, 0))
+        self.assertEqual(self.set_pic(second), name)
+        with mock.patch(
+            'foodgram.images.get_referenced', return_value=set()
+        ):
+            self.assertEqual(collect_images(), 0)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_avatar_delete_keeps_shared_file(self):
+        for user in (self.user, self.author):
+            self.client.force_authenticate(user)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.put(
+                    '/api/users/me/avatar/', {'avatar': self.get_image()},
+                    format='json'
+                )
+            user.refresh_from_db()
+        name = self.user.avatar.name
+        self.assertEqual(self.author.avatar.name, name)
+        self.client.delete('/api/users/me/avatar/')
+        collect_images(grace=0)
+        self.assertTrue(default_storage.exists(name))
+        self.client.force_authenticate(self.user)
+        self.client.delete('/api/users/me/avatar/')
+        collect_images(grace=0)
+        self.assertFalse(default_storage.exists(name))
+
+
+class ImageUploadTest(MediaTestCase):
+    url = '/api/uploads/'
+
+    def upload(self, content, name='image.png'):
+        return self.client.post(
+            self.url, {'file': SimpleUploadedFile(name, content)},
+            format='multipart'
+        )
+
+    def test_upload_token_replaces_base64(self):
+        response = self.upload(self.get_image_bytes())
+        self.assertEqual(response.status_code, 201)
+        token = response.data['token']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                '/api/users/me/avatar/', {'avatar': token}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        with self.user.avatar.open() as file:
+            self.assertEqual(file.read(), self.get_image_bytes())
+        self.assertEqual(os.listdir(settings.UPLOAD_ROOT), [])
+        response = self.client.put(
+            '/api/users/me/avatar/', {'avatar': token}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put(
+            '/api/users/me/avatar/', {'avatar': self.get_image()},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_token_survives_rejected_recipe(self):
+        token = self.upload(self.get_image_bytes()).data['token']
+        data = {
+            'name': 'Рецепт с загрузкой', 'text': 'Описание',
+            'cooking_time': 10, 'image': token,
+            'tags': [Tag.objects.first().id], 'ingredients': [],
+        }
+        response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        data['ingredients'] = [
+            {'id': Ingredient.objects.first().id, 'amount': 5}
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(os.listdir(settings.UPLOAD_ROOT), [])
+
+    def test_invalid_tokens(self):
+        token = self.upload(self.get_image_bytes()).data['token']
+        self.client.force_authenticate(self.author)
+        for value in (token, token[:-1] + 'x'):
+            response = self.client.put(
+                '/api/users/me/avatar/', {'avatar': value}, format='json'
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_rejected_uploads(self):
+        self.assertEqual(self.upload(b'not an image').status_code, 400)
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+        with mock.patch.object(c, 'UPLOAD_MAX_SIZE', 1000):
+            response = self.upload(self.get_image_bytes())
+        self.assertEqual(response.status_code, 413)
+
+
+class ShortLinkTest(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        resolve_stored_short_link.cache_clear()
+        self.addCleanup(click_counter.reset)
+
+    def test_codes_are_bijective(self):
+        ids = list(range(1, 2000)) + [10 ** 9, 10 ** 12]
+        codes = [encode_short_link(recipe_id) for recipe_id in ids]
+        self.assertEqual(len(set(codes)), len(ids))
+        for recipe_id, code in zip(ids, codes):
+            self.assertEqual(len(code), c.SHORT_LINK_CODE_LENGTH)
+            self.assertEqual(decode_short_link(code), recipe_id)
+        self.assertIsNone(decode_short_link('abc-def'))
+
+    def test_redirects(self):
+        recipe = Recipe.objects.order_by('pk').first()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                f'/api/recipes/{recipe.id}/get-link/'
+            )
+        self.assertFalse(any(
+            query['sql'].startswith(('UPDATE', 'INSERT'))
+            for query in context.captured_queries
+        ))
+        short_link = response.data['short-link'].rsplit('/', 1)[1]
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/s/{short_link}/')
+        self.assertRedirects(
+            response, f'/recipes/{recipe.id}/', fetch_redirect_response=False
+        )
+        Recipe.objects.filter(pk=recipe.pk).update(short_link='Ab3dE9')
+        for queries in (1, 0):
+            with self.assertNumQueries(queries):
+                response = self.client.get('/s/Ab3dE9/')
+            self.assertEqual(response['Location'], f'/recipes/{recipe.id}/')
+        self.assertEqual(self.client.get('/s/zzzzzz/').status_code, 404)
+
+
+class ShortLinkClicksTest(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        click_counter.reset()
+        self.addCleanup(click_counter.reset)
+
+    def test_clicks_are_flushed_in_batches(self):
+        first, second = Recipe.objects.order_by('pk')[:2]
+        links = [first.get_short_link()] * 3 + [second.get_short_link()]
+        with self.assertNumQueries(0):
+            for link in links:
+                self.client.get(f'/s/{link}/')
+        self.assertFalse(RecipeClicks.objects.exists())
+        with self.assertNumQueries(2):
+            self.assertEqual(click_counter.flush(), 2)
+        self.client.get(f'/s/{first.get_short_link()}/')
+        click_counter.add(10 ** 9)
+        click_counter.flush()
+        self.assertEqual(
+            dict(RecipeClicks.objects.values_list('recipe_id', 'total')),
+            {first.id: 4, second.id: 1}
+        )
+
+    def test_size_threshold_triggers_flush(self):
+        recipe = Recipe.objects.order_by('pk').first()
+        with mock.patch.object(c, 'CLICKS_FLUSH_SIZE', 3):
+            for _ in range(3):
+                self.client.get(f'/s/{recipe.get_short_link()}/')
+        self.assertEqual(RecipeClicks.objects.get().total, 3)
+        self.assertIsNone(click_counter.timer)
+
+
+class BenchmarkBudgetTest(TestCase):
+    def test_query_budgets(self):
+        baselines = load_baselines()
+        sizes = sorted(
+            {int(size) for route in baselines.values()
+             for size in route['results']}
+        )
+        report = run_benchmark(sizes, repeat=1)
+        self.assertEqual(check_budgets(report, baselines), [])
+
+    def test_missing_sizes_and_bytes_are_violations(self):
+        result = {'status': 200, 'queries': 2, 'p95_ms': 1.0, 'bytes': 100}
+        baselines = {
+            'route': {'scaling': 'O(1)', 'results': {'10': result}}
+        }
+        report = {'routes': {
+            'route': {'scaling': 'O(1)', 'results': {
+                '10': dict(result, bytes=111), '100': result
+            }},
+            'other': {'scaling': 'O(1)', 'results': {'10': result}},
+        }}
+        self.assertEqual(len(check_budgets(report, baselines)), 3)
+        report['routes']['route']['results']['10']['bytes'] = 110
+        self.assertEqual(len(check_budgets(report, baselines)), 2)
@@ -0,0 +1,115 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import (
+    SkipFile, TemporaryFileUploadHandler
+)
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from PIL import Image
+
+from foodgram import constants as c
+
+
+UPLOAD_SALT = 'api.uploads'
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > c.UPLOAD_MAX_SIZE:
+            self.too_large = True
+            raise SkipFile
+        return super().receive_data_chunk(raw_data, start)
+
+
+def get_upload_storage():
+    return FileSystemStorage(location=settings.UPLOAD_ROOT)
+
+
+def get_image_format(file):
+    try:
+        with Image.open(file) as image:
+            image.verify()
+            return image.format
+    except Exception:
+        return None
+    finally:
+        file.seek(0)
+
+
+def store_upload(file, user):
+    extension = EXTENSIONS.get(get_image_format(file))
+    if extension is None:
+        return None
+    name = get_upload_storage().save(
+        f'{get_random_string(c.UPLOAD_NAME_LENGTH)}.{extension}', file
+    )
+    return signing.dumps({'user': user.pk, 'name': name}, salt=UPLOAD_SALT)
+
+
+def is_upload_token(value):
+    return ':' in value and not value.startswith('data:')
+
+
+class Upload(File):
+    def __init__(self, storage, name):
+        self.storage = storage
+        self.upload_name = name
+        self._file = None
+        self.name = os.path.basename(name)
+        self.mode = 'rb'
+
+    @property
+    def file(self):
+        if self._file is None:
+            self._file = self.storage.open(self.upload_name)
+        return self._file
+
+    @file.setter
+    def file(self, file):
+        self._file = file
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    def remove(self):
+        self.storage.delete(self.upload_name)
+
+
+def open_upload(token, user):
+    try:
+        payload = signing.loads(
+            token, salt=UPLOAD_SALT, max_age=c.UPLOAD_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
+    storage = get_upload_storage()
+    if payload['user'] != user.pk or not storage.exists(payload['name']):
+        return None
+    return Upload(storage, payload['name'])
+
+
+def clear_uploads():
+    storage = get_upload_storage()
+    if not os.path.isdir(storage.location):
+        return 0
+    expired_before = timezone.now() - timedelta(
+        seconds=c.UPLOAD_TOKEN_MAX_AGE
+    )
+    _, names = storage.listdir('')
+    expired = [
+        name for name in names
+        if storage.get_modified_time(name) < expired_before
+    ]
+    for name in expired:
+        storage.delete(name)
+    return len(expired)
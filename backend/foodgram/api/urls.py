@@ -1,7 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from api.views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from api.views import (
+    ImageUploadView, IngredientViewSet, RecipeViewSet, ReferenceDataView,
+    TagViewSet, UserViewSet
+)
 
 router = DefaultRouter()
 
@@ -16,6 +19,17 @@ for route, viewset, basename in ENDPOINTS:
     router.register(route, viewset, basename=basename)
 
 urlpatterns = [
+    path(
+        'reference-data/',
+        ReferenceDataView.as_view(),
+        name='reference_data'
+    ),
+    path(
+        'reference-data/<str:content_hash>/',
+        ReferenceDataView.as_view(),
+        name='reference_data_snapshot'
+    ),
+    path('uploads/', ImageUploadView.as_view(), name='uploads'),
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,33 +1,58 @@
-import io
+import hashlib
 import os
 
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import FileResponse
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import (
+    BooleanField, F, Prefetch, Value, prefetch_related_objects
+)
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified,
+    StreamingHttpResponse
+)
+from django.shortcuts import get_object_or_404, redirect
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_etags, quote_etag
+from django.views import View
 from django.views.generic import RedirectView
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
 from dotenv import load_dotenv
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import (
     SAFE_METHODS, IsAuthenticatedOrReadOnly, IsAuthenticated
 )
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from api.counts import invalidate_counts
 from api.filters import RecipeFilter
 from api.paginations import FoodGramPagination
 from api.permissions import IsAuthorOrReadOnly
 from api.serializers import (
-    FavoriteSerializer, IngredientSerializer, PasswordChangeSerializer,
-    RecipeReadSerializer, RecipeWriteSerializer, ShoppingCartSerializer,
-    SubscriptionSerializer, SubscriptionCreateSerializer, TagSerializer,
-    UserAvatarSerializer
+    CookQuerySerializer, CookRecipeSerializer, FavoriteSerializer,
+    IngredientSerializer, PasswordChangeSerializer, RecipeBatchSerializer,
+    RecipeReadSerializer, RecipeShortSerializer, RecipeWriteSerializer,
+    ShoppingCartSerializer, SimilarQuerySerializer, SubscriptionSerializer,
+    SubscriptionCreateSerializer, TagSerializer, UserAvatarSerializer
+)
+from api.shopping_cart import (
+    STREAMS, CSVRenderer, JSONDownloadRenderer, PDFRenderer, TextRenderer,
+    pdf_available, write_pdf
 )
+from api.uploads import LimitedUploadHandler, store_upload
+from foodgram import constants as c
+from recipes.clicks import click_counter
+from recipes.cook_index import cook_index
+from recipes.ingredient_index import ingredient_index
 from recipes.models import (
-    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag
+    Favorite, FeedEntry, Ingredient, Recipe, ShoppingCart, SimilarRecipe, Tag
 )
+from recipes.reference_data import reference_snapshot
+from recipes.service import decode_short_link, resolve_stored_short_link
 from users.models import Subscription
 
 
@@ -60,7 +85,9 @@ class UserViewSet(DjoserUserViewSet):
     def avatar(self, request):
         user = request.user
         if request.method == 'PUT':
-            serializer = UserAvatarSerializer(instance=user, data=request.data)
+            serializer = UserAvatarSerializer(
+                instance=user, data=request.data, context={'request': request}
+            )
             serializer.is_valid(raise_exception=True)
             serializer.save()
             return Response(serializer.data)
@@ -101,8 +128,15 @@ class UserViewSet(DjoserUserViewSet):
     def subscriptions(self, request):
         subscriptions = User.objects.filter(
             subscribers__subscriber=request.user
-        )
+        ).annotate(is_subscribed=Value(True, output_field=BooleanField()))
         page = self.paginate_queryset(subscriptions)
+        recipes = Recipe.objects.filter(author__in=page)
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes.limit_per_author(int(recipes_limit))
+        prefetch_related_objects(
+            page, Prefetch('recipes', recipes, to_attr='limited_recipes')
+        )
         serializer = SubscriptionSerializer(
             page, many=True, context={'request': request}
         )
@@ -149,12 +183,81 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        name = self.request.query_params.get('name')
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
         if name:
-            queryset = queryset.filter(name__istartswith=name)
-        return queryset
+            return Response(ingredient_index.search(name))
+        return Response(ingredient_index.all())
+
+
+class ImageUploadView(APIView):
+    permission_classes = (IsAuthenticated,)
+    parser_classes = (MultiPartParser,)
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [LimitedUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def post(self, request):
+        file = request.FILES.get('file')
+        if request.upload_handlers[0].too_large:
+            return Response(
+                {'file': ['Файл слишком большой.']},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        if file is None:
+            return Response(
+                {'file': ['Файл не передан.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        token = store_upload(file, request.user)
+        if token is None:
+            return Response(
+                {'file': ['Загрузите корректное изображение.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            {'token': token, 'expires_in': c.UPLOAD_TOKEN_MAX_AGE},
+            status=status.HTTP_201_CREATED
+        )
+
+
+class ReferenceDataView(View):
+    def get(self, request, content_hash=None):
+        snapshot = reference_snapshot.ensure_fresh()
+        if content_hash is not None and content_hash != snapshot.content_hash:
+            return redirect(
+                'reference_data_snapshot', content_hash=snapshot.content_hash
+            )
+        etag = quote_etag(snapshot.content_hash)
+        client_etags = [
+            value.removeprefix('W/') for value in
+            parse_etags(request.headers.get('If-None-Match', ''))
+        ]
+        if etag in client_etags or '*' in client_etags:
+            response = HttpResponseNotModified()
+        elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(
+                snapshot.compressed, content_type='application/json'
+            )
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(
+                snapshot.content, content_type='application/json'
+            )
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        if content_hash is None:
+            response['Cache-Control'] = 'no-cache'
+            response['Content-Location'] = reverse(
+                'reference_data_snapshot',
+                kwargs={'content_hash': snapshot.content_hash}
+            )
+        else:
+            response['Cache-Control'] = (
+                f'public, max-age={c.REFERENCE_DATA_MAX_AGE}, immutable'
+            )
+        return response
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -163,6 +266,63 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    lookup_value_regex = r'\d+'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve', 'feed'):
+            user = self.request.user
+            queryset = queryset.with_user_flags(user).with_author(user)
+        return queryset
+
+    def get_etag(self, recipes, *state):
+        user = self.request.user
+        signature = [self.request.get_full_path(), user.pk, *state]
+        for recipe in recipes:
+            signature.append((
+                recipe.pk, recipe.updated_at.isoformat(),
+                getattr(recipe, 'is_favorited', False),
+                getattr(recipe, 'is_in_shopping_cart', False),
+                getattr(recipe.author, 'is_subscribed', False),
+            ))
+        return quote_etag(
+            hashlib.md5(repr(signature).encode()).hexdigest()
+        )
+
+    def add_validators(self, response, etag, last_modified=None):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        response['Cache-Control'] = (
+            'private, no-cache' if self.request.user.is_authenticated
+            else 'no-cache'
+        )
+        patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        etag = self.get_etag(page, *self.paginator.get_validator_state())
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+        return self.add_validators(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        recipe = self.get_object()
+        etag = self.get_etag([recipe])
+        last_modified = (
+            None if request.user.is_authenticated else recipe.updated_at
+        )
+        response = get_conditional_response(
+            request, etag=etag,
+            last_modified=last_modified and int(last_modified.timestamp())
+        )
+        if response is None:
+            response = Response(self.get_serializer(recipe).data)
+        return self.add_validators(response, etag, last_modified)
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
@@ -170,38 +330,99 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return RecipeWriteSerializer
 
     def get_ingredients_list(self, request):
-        shopping_cart = ShoppingCart.objects.filter(user=request.user)
-        recipe_ids = shopping_cart.values_list('recipe', flat=True)
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__in=recipe_ids
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(total_amount=Sum('amount'))
-        return ingredients
-
-    def format_ingredients_to_text(self, ingredients):
-        lines = []
-        for item in ingredients:
-            line = (f'{item["ingredient__name"]} '
-                    f'({item["ingredient__measurement_unit"]}) - '
-                    f'{item["total_amount"]}')
-            lines.append(line)
-        return '\n'.join(lines)
+        ingredients = request.user.shopping_cart_ingredients.values(
+            'ingredient__name', 'ingredient__measurement_unit',
+            total_amount=F('amount')
+        ).order_by('ingredient__name', 'ingredient__measurement_unit')
+        return ingredients.iterator(chunk_size=c.SHOPPING_CART_CHUNK_SIZE)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='what_to_cook'
+    )
+    def what_to_cook(self, request):
+        serializer = CookQuerySerializer(data={
+            'ingredients': [
+                value for item in request.query_params.getlist('ingredients')
+                for value in item.split(',') if value
+            ],
+            'limit': request.query_params.get('limit', c.PAGE_SIZE),
+        })
+        serializer.is_valid(raise_exception=True)
+        while True:
+            matches = cook_index.search(**serializer.validated_data)
+            recipes = Recipe.objects.in_bulk(
+                [recipe_id for recipe_id, _, _ in matches]
+            )
+            deleted = [
+                recipe_id for recipe_id, _, _ in matches
+                if recipe_id not in recipes
+            ]
+            if not deleted:
+                break
+            cook_index.discard(deleted)
+        for recipe_id, matched, missing in matches:
+            recipes[recipe_id].matched = matched
+            recipes[recipe_id].missing = missing
+        return Response(CookRecipeSerializer(
+            [recipes[recipe_id] for recipe_id, _, _ in matches],
+            many=True, context=self.get_serializer_context()
+        ).data)
 
     @action(
         detail=False,
         methods=['get'],
         permission_classes=[IsAuthenticated],
-        url_path='download_shopping_cart'
+        url_path='feed'
+    )
+    def feed(self, request):
+        recipe_ids = self.paginator.paginate_ids(
+            FeedEntry.objects.get_sources(request.user), request
+        )
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = RecipeReadSerializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes],
+            many=True, context=self.get_serializer_context()
+        )
+        return self.paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        url_path='download_shopping_cart',
+        renderer_classes=[
+            TextRenderer, CSVRenderer, JSONDownloadRenderer, PDFRenderer
+        ]
     )
     def download_shopping_cart(self, request):
-        ingredients = self.get_ingredients_list(request)
-        content = self.format_ingredients_to_text(ingredients)
-        content_bytes = content.encode('utf-8')
-        file = io.BytesIO(content_bytes)
-        response = FileResponse(file, content_type='text/plain')
-        response[
-            'Content-Disposition'] = 'attachment; filename="shopping_cart.txt"'
+        renderer = request.accepted_renderer
+        filename = f'shopping_cart.{renderer.format}'
+        if renderer.format == 'pdf':
+            if not pdf_available():
+                return Response(
+                    {'errors': 'Формирование PDF недоступно.'},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    content_type='application/json'
+                )
+            return FileResponse(
+                write_pdf(self.get_ingredients_list(request)),
+                as_attachment=True, filename=filename,
+                content_type=renderer.media_type
+            )
+        content = (
+            chunk.encode('utf-8')
+            for chunk in STREAMS[renderer.format](
+                self.get_ingredients_list(request)
+            )
+        )
+        response = StreamingHttpResponse(
+            content, content_type=f'{renderer.media_type}; charset=utf-8'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{filename}"'
+        )
         return response
 
     def _add_or_remove_from_list(self, request, pk, model, serializer_class):
@@ -222,6 +443,72 @@ class RecipeViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    def _batch_add_or_remove_from_list(self, request, model):
+        serializer = RecipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        found = set(
+            Recipe.objects.filter(id__in=recipe_ids)
+            .values_list('id', flat=True)
+        )
+        items = model.objects.filter(user=request.user, recipe_id__in=found)
+        with transaction.atomic():
+            present = set(items.values_list('recipe_id', flat=True))
+            if request.method == 'POST':
+                changed = found - present
+                model.objects.bulk_create(
+                    [
+                        model(user=request.user, recipe_id=recipe_id)
+                        for recipe_id in recipe_ids if recipe_id in changed
+                    ],
+                    ignore_conflicts=True
+                )
+            else:
+                changed = present
+                if changed:
+                    items.filter(recipe_id__in=changed).bulk_delete()
+        if changed:
+            invalidate_counts(model, request.user.pk)
+        results = []
+        for recipe_id in recipe_ids:
+            if recipe_id not in found:
+                result = {
+                    'status': status.HTTP_404_NOT_FOUND,
+                    'errors': 'Рецепт не найден.'
+                }
+            elif recipe_id not in changed:
+                result = {
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'errors': (
+                        'Рецепт уже в списке.' if request.method == 'POST'
+                        else 'Рецепт отсутствует в списке.'
+                    )
+                }
+            elif request.method == 'POST':
+                result = {'status': status.HTTP_201_CREATED}
+            else:
+                result = {'status': status.HTTP_204_NO_CONTENT}
+            results.append({'id': recipe_id, **result})
+        return Response({'results': results})
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart/batch'
+    )
+    def shopping_cart_batch(self, request):
+        return self._batch_add_or_remove_from_list(request, ShoppingCart)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated],
+        url_path='favorite/batch'
+    )
+    def favorite_batch(self, request):
+        return self._batch_add_or_remove_from_list(request, Favorite)
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -251,16 +538,39 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def get_link(self, request, pk=None):
         recipe = self.get_object()
-        if not recipe.short_link:
-            recipe.save()
         return Response({'short-link': request.build_absolute_uri(
-            f'/s/{recipe.short_link}'
+            f'/s/{recipe.get_short_link()}'
         )})
 
+    @action(
+        detail=True,
+        methods=['get'],
+        url_path='similar'
+    )
+    def similar(self, request, pk=None):
+        serializer = SimilarQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        similarities = SimilarRecipe.objects.filter(
+            recipe_id=pk
+        ).select_related('similar').order_by('-score')[
+            :serializer.validated_data['limit']
+        ]
+        if not similarities:
+            get_object_or_404(Recipe, pk=pk)
+        return Response(RecipeShortSerializer(
+            [similarity.similar for similarity in similarities],
+            many=True, context=self.get_serializer_context()
+        ).data)
+
 
 class ShortLinkRedirectView(RedirectView):
     permanent = False
 
     def get_redirect_url(self, *args, **kwargs):
-        recipe = get_object_or_404(Recipe, short_link=kwargs['short_link'])
-        return f'/recipes/{recipe.id}/'
+        recipe_id = decode_short_link(kwargs['short_link'])
+        if recipe_id is None:
+            recipe_id = resolve_stored_short_link(kwargs['short_link'])
+        if recipe_id is None:
+            raise Http404('Рецепт не найден.')
+        click_counter.add(recipe_id)
+        return f'/recipes/{recipe_id}/'
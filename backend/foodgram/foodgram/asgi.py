@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_asgi_application()
+
+from recipes.cook_index import cook_index  # noqa: E402
+
+cook_index.start()
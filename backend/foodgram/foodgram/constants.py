@@ -4,6 +4,12 @@ USERNAME_REGEX = r'^[\w.@+-]+\Z'
 
 SHORT_LINK_LENGTH = 6
 
+SHORT_LINK_CODE_LENGTH = 7
+
+SHORT_LINK_ROUNDS = 4
+
+SHORT_LINK_CACHE_SIZE = 10000
+
 TAG_NAME_MAX_LENGTH = 32
 
 TAG_SLUG_MAX_LENGTH = 32
@@ -21,3 +27,89 @@ MIN_INGR_AMOUNT = 1
 PAGE_SIZE = 6
 
 DATA_UPLOAD_MAX_MEMORY_SIZE = 20971520
+
+COUNT_CACHE_TIMEOUT = 60
+
+COUNT_ESTIMATE_THRESHOLD = 100000
+
+RECIPE_CACHE_TIMEOUT = 300
+
+REFERENCE_DATA_MAX_AGE = 60 * 60 * 24 * 365
+
+SHOPPING_CART_CHUNK_SIZE = 2000
+
+PDF_SPOOL_MAX_SIZE = 1024 * 1024
+
+PDF_MARGIN = 40
+
+PDF_FONT_SIZE = 12
+
+PDF_LINE_HEIGHT = 18
+
+RECIPE_BATCH_MAX_SIZE = 100
+
+FEED_FANOUT_MAX_SUBSCRIBERS = 10000
+
+FEED_BATCH_SIZE = 5000
+
+SEARCH_CONFIG = 'russian'
+
+SEARCH_NAME_WEIGHT = 10.0
+
+SEARCH_DESCRIPTION_WEIGHT = 1.0
+
+COOK_INDEX_CHUNK_SIZE = 10000
+
+COOK_INDEX_SYNC_LAG = 5
+
+COOK_INDEX_REBUILD_INTERVAL = 60 * 60
+
+COOK_INDEX_BITMAP_RATIO = 64
+
+COOK_INDEX_RETRY_INTERVAL = 60
+
+COOK_INDEX_WAIT_TIMEOUT = 30
+
+COOK_MAX_INGREDIENTS = 100
+
+COOK_MAX_RESULTS = 100
+
+SIMILAR_RECIPES_LIMIT = 20
+
+RECOMMENDATIONS_READ_CHUNK_SIZE = 10000
+
+TRENDING_HALF_LIFE = 24 * 60 * 60
+
+TRENDING_REBASE_HALF_LIVES = 32
+
+TRENDING_MIN_SCORE = 1e-6
+
+TRENDING_FAVORITE_WEIGHT = 1.0
+
+TRENDING_SHOPPING_CART_WEIGHT = 2.0
+
+TRENDING_SETTLE_DELAY = 5 * 60
+
+TRENDING_CHUNK_SIZE = 10000
+
+TRENDING_UPDATE_BATCH_SIZE = 500
+
+IMAGE_VARIANTS = (
+    ('thumbnail', 160),
+    ('card', 480),
+    ('full', 1280),
+)
+
+IMAGE_QUALITY = 80
+
+IMAGE_COLLECT_GRACE = 24 * 60 * 60
+
+UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+
+UPLOAD_TOKEN_MAX_AGE = 60 * 60
+
+UPLOAD_NAME_LENGTH = 32
+
+CLICKS_FLUSH_SIZE = 100
+
+CLICKS_FLUSH_INTERVAL = 10
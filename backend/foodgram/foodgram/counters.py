@@ -0,0 +1,22 @@
+from django.db.models import F
+
+
+class CounterFieldsMixin:
+    counter_fields = ()
+    computed_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.name not in self.computed_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+def change_counter(queryset, field, delta):
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
@@ -0,0 +1,239 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import lru_cache, partial
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from foodgram import constants as c
+
+
+logger = logging.getLogger(__name__)
+
+variants_ready = Signal()
+
+IMAGE_FORMATS = (
+    ('webp', 'WEBP', {'quality': c.IMAGE_QUALITY, 'method': 4}),
+    ('jpeg', 'JPEG', {
+        'quality': c.IMAGE_QUALITY, 'optimize': True, 'progressive': True
+    }),
+)
+
+
+class ImageVariantsMixin:
+    variant_fields = {}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.stored_images = {
+            field: getattr(
+                instance.__dict__[field], 'name', instance.__dict__[field]
+            ) or None
+            for field in cls.variant_fields if field in instance.__dict__
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        stored_images = getattr(self, 'stored_images', {})
+        uncommitted = {
+            field for field in self.variant_fields
+            if getattr(self, field) and not getattr(self, field)._committed
+        }
+        super().save(*args, **kwargs)
+        changed = []
+        for field, variants_field in self.variant_fields.items():
+            name = getattr(self, field).name or None
+            if field in stored_images:
+                previous = stored_images[field]
+                if name == previous:
+                    continue
+            elif field not in uncommitted and (
+                name or not getattr(self, variants_field)
+            ):
+                continue
+            changed.append(field)
+            stored_images[field] = name
+        self.stored_images = stored_images
+        if not changed:
+            return
+        if not adding:
+            type(self).objects.filter(pk=self.pk).update(**{
+                self.variant_fields[field]: {} for field in changed
+            })
+        for field in changed:
+            setattr(self, self.variant_fields[field], {})
+            file = getattr(self, field)
+            if file:
+                schedule_variants(type(self), self.pk, field, file.name)
+
+
+def get_variant_name(name, variant, extension):
+    directory, filename = os.path.split(os.path.splitext(name)[0])
+    return os.path.join(
+        directory, 'variants', f'{filename}_{variant}.{extension}'
+    )
+
+
+def prepare_image(image):
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGB', 'RGBA'):
+        return image
+    if image.mode in ('LA', 'PA') or 'transparency' in image.info:
+        return image.convert('RGBA')
+    return image.convert('RGB')
+
+
+def flatten(image):
+    if image.mode != 'RGBA':
+        return image
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def get_variant_names(name):
+    return {
+        variant: {
+            extension: get_variant_name(name, variant, extension)
+            for extension, _, _ in IMAGE_FORMATS
+        }
+        for variant, _ in c.IMAGE_VARIANTS
+    }
+
+
+def make_variants(name, storage):
+    names = get_variant_names(name)
+    if all(
+        storage.exists(variant_name)
+        for formats in names.values() for variant_name in formats.values()
+    ):
+        return names
+    largest = max(size for _, size in c.IMAGE_VARIANTS)
+    with storage.open(name) as file, Image.open(file) as source:
+        source.draft('RGB', (largest, largest))
+        image = prepare_image(source)
+        for variant, size in c.IMAGE_VARIANTS:
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            for extension, image_format, options in IMAGE_FORMATS:
+                buffer = BytesIO()
+                target = (
+                    flatten(resized) if image_format == 'JPEG' else resized
+                )
+                target.save(buffer, image_format, **options)
+                storage.save_once(
+                    names[variant][extension], ContentFile(buffer.getvalue())
+                )
+    return names
+
+
+def get_storage(model, field):
+    return model._meta.get_field(field).storage
+
+
+def get_image_fields():
+    return [
+        (model, field) for model in apps.get_models()
+        if issubclass(model, ImageVariantsMixin)
+        for field in model.variant_fields
+    ]
+
+
+def get_referenced(names):
+    referenced = set()
+    for model, field in get_image_fields():
+        referenced.update(
+            model.objects.filter(**{f'{field}__in': names}).values_list(
+                field, flat=True
+            )
+        )
+    return referenced
+
+
+def delete_image(storage, name):
+    storage.delete(name)
+    for formats in get_variant_names(name).values():
+        for variant_name in formats.values():
+            storage.delete(variant_name)
+
+
+def collect_images(grace=c.IMAGE_COLLECT_GRACE):
+    collected_before = timezone.now() - timedelta(seconds=grace)
+    locations = {}
+    for model, field in get_image_fields():
+        model_field = model._meta.get_field(field)
+        locations[model_field.storage.path(model_field.upload_to)] = (
+            model_field.storage, model_field.upload_to
+        )
+    removed = 0
+    for storage, directory in locations.values():
+        if not storage.exists(directory):
+            continue
+        for prefix in storage.listdir(directory)[0]:
+            _, files = storage.listdir(os.path.join(directory, prefix))
+            names = [
+                name for name in (
+                    os.path.join(directory, prefix, file) for file in files
+                )
+                if storage.get_modified_time(name) < collected_before
+            ]
+            referenced = get_referenced(names)
+            for name in names:
+                if (
+                    name not in referenced
+                    and storage.get_modified_time(name) < collected_before
+                ):
+                    delete_image(storage, name)
+                    removed += 1
+    return removed
+
+
+def build_variants(model, pk, field, name):
+    try:
+        variants = make_variants(name, get_storage(model, field))
+        values = {model.variant_fields[field]: variants}
+        for model_field in model._meta.concrete_fields:
+            if getattr(model_field, 'auto_now', False):
+                values[model_field.name] = timezone.now()
+        updated = model.objects.filter(pk=pk, **{field: name}).update(
+            **values
+        )
+        if updated:
+            variants_ready.send(sender=model, pk=pk, field=field)
+    except Exception:
+        logger.exception('Не удалось подготовить изображения для %s', name)
+
+
+def run_in_background(model, pk, field, name):
+    try:
+        build_variants(model, pk, field, name)
+    finally:
+        connections.close_all()
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(
+        max_workers=settings.IMAGE_WORKERS, thread_name_prefix='images'
+    )
+
+
+def submit_variants(model, pk, field, name):
+    if settings.IMAGE_VARIANTS_ASYNC:
+        get_executor().submit(run_in_background, model, pk, field, name)
+    else:
+        build_variants(model, pk, field, name)
+
+
+def schedule_variants(model, pk, field, name):
+    transaction.on_commit(partial(submit_variants, model, pk, field, name))
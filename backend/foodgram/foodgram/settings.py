@@ -11,6 +11,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.getenv('DJANGO_KEY', 'default-key')
 
+SHORT_LINK_KEY = os.getenv('SHORT_LINK_KEY', SECRET_KEY)
+
 DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
 
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
@@ -79,6 +81,27 @@ else:
         }
     }
 
+if os.getenv('DB_ENGINE') == 'PG':
+    CACHES = {
+        'default': {
+            'BACKEND': os.getenv(
+                'CACHE_BACKEND',
+                'django.core.cache.backends.memcached.PyMemcacheCache'
+            ),
+            'LOCATION': os.getenv('CACHE_LOCATION', 'memcached:11211'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': os.getenv(
+                'CACHE_BACKEND',
+                'django.core.cache.backends.locmem.LocMemCache'
+            ),
+            'LOCATION': os.getenv('CACHE_LOCATION', ''),
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -116,6 +139,18 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+UPLOAD_ROOT = os.getenv('UPLOAD_ROOT', os.path.join(BASE_DIR, 'uploads'))
+
+IMAGE_VARIANTS_ASYNC = os.getenv(
+    'IMAGE_VARIANTS_ASYNC', 'True'
+).lower() == 'true'
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+PDF_FONT_PATH = os.getenv(
+    'PDF_FONT_PATH', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 # Default primary key field type
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
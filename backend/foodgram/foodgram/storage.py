@@ -0,0 +1,65 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.db.models.fields.files import ImageFieldFile
+
+
+def get_content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        content_hash = get_content_hash(content)
+        name = os.path.join(
+            os.path.dirname(name), content_hash[:2],
+            content_hash + os.path.splitext(name)[1].lower()
+        )
+        return self.save_once(name, content, max_length)
+
+    def save_once(self, name, content, max_length=None):
+        try:
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+        saved = super().save(name, content, max_length)
+        if saved != name:
+            self.delete(saved)
+        return name
+
+
+content_storage = ContentAddressedStorage()
+
+
+class ContentImageFieldFile(ImageFieldFile):
+    def delete(self, save=True):
+        if not self:
+            return
+        if hasattr(self, '_file'):
+            self.close()
+            del self.file
+        self.name = None
+        setattr(self.instance, self.field.attname, self.name)
+        self._committed = False
+        if save:
+            self.instance.save()
+
+
+class ContentImageField(models.ImageField):
+    attr_class = ContentImageFieldFile
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('storage', content_storage)
+        kwargs.setdefault('db_index', True)
+        super().__init__(*args, **kwargs)
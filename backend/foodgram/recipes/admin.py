@@ -55,11 +55,13 @@ class IngredientAdmin(admin.ModelAdmin):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    readonly_fields = ('short_link',)
+    readonly_fields = ('get_short_link', 'clicks_total')
     list_display = (
-        'id', 'name', 'author', 'time_to_cook', 'short_link', 'favorites_count'
+        'id', 'name', 'author', 'time_to_cook', 'get_short_link',
+        'favorites_count', 'clicks_total'
     )
-    list_display_links = ('name', 'short_link')
+    list_select_related = ('author', 'clicks')
+    list_display_links = ('name', 'get_short_link')
     search_fields = ('name', 'author__username')
     list_filter = ('author', 'tags')
     ordering = ('name',)
@@ -69,7 +71,7 @@ class RecipeAdmin(admin.ModelAdmin):
         (None, {
             'fields': (
                 'author', 'name', 'pic', 'description', 'tags',
-                'time_to_cook', 'short_link'
+                'time_to_cook', 'get_short_link', 'clicks_total'
             )
         }),
     )
@@ -0,0 +1,70 @@
+import atexit
+import logging
+import threading
+from collections import Counter
+
+from django.db import DatabaseError, connections
+
+from foodgram import constants as c
+
+
+logger = logging.getLogger(__name__)
+
+
+class ClickCounter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.size = 0
+        self.timer = None
+
+    def add(self, recipe_id):
+        with self.lock:
+            self.pending[recipe_id] += 1
+            self.size += 1
+            full = self.size >= c.CLICKS_FLUSH_SIZE
+            if not full and self.timer is None:
+                self.timer = threading.Timer(
+                    c.CLICKS_FLUSH_INTERVAL, self.flush_in_background
+                )
+                self.timer.daemon = True
+                self.timer.start()
+        if full:
+            self.flush()
+
+    def take(self):
+        with self.lock:
+            pending, self.pending, self.size = self.pending, Counter(), 0
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        return pending
+
+    def reset(self):
+        self.take()
+
+    def flush(self):
+        from recipes.models import RecipeClicks
+
+        pending = self.take()
+        if not pending:
+            return 0
+        try:
+            return RecipeClicks.objects.add(pending)
+        except DatabaseError:
+            logger.exception('Не удалось сохранить переходы по ссылкам')
+            with self.lock:
+                self.pending.update(pending)
+                self.size += sum(pending.values())
+            return 0
+
+    def flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+
+click_counter = ClickCounter()
+
+atexit.register(click_counter.flush)
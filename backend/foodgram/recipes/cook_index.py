@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+from itertools import chain
+
+import numpy as np
+from django.db import connections
+from django.utils import timezone
+
+from foodgram import constants as c
+
+
+logger = logging.getLogger(__name__)
+
+EMPTY = np.empty(0, dtype=np.int64)
+
+UNMATCHED = np.iinfo(np.int32).max
+
+
+def load_pairs(rows):
+    return np.fromiter(
+        chain.from_iterable(rows), dtype=np.int64
+    ).reshape(-1, 2)
+
+
+def resized(values, size):
+    result = np.zeros(max(size, len(values)), dtype=values.dtype)
+    result[:len(values)] = values
+    return result
+
+
+class CookIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.thread = None
+        self.postings = {}
+        self.bitmaps = {}
+        self.built_size = 0
+        self.sizes = np.empty(0, dtype=np.int32)
+        self.stale = EMPTY
+        self.extra_ingredients = EMPTY
+        self.extra_recipes = EMPTY
+        self.built_at = None
+        self.synced_at = None
+
+    def reset(self):
+        self.built_at = None
+        self.ready.clear()
+
+    def build(self):
+        from recipes.models import RecipeIngredient
+
+        started = timezone.now()
+        pairs = load_pairs(
+            RecipeIngredient.objects.order_by('ingredient_id', 'recipe_id')
+            .values_list('ingredient_id', 'recipe_id')
+            .iterator(chunk_size=c.COOK_INDEX_CHUNK_SIZE)
+        )
+        ingredient_ids, starts = np.unique(pairs[:, 0], return_index=True)
+        sizes = np.bincount(pairs[:, 1]).astype(np.int32)
+        postings, bitmaps = {}, {}
+        for ingredient_id, posting in zip(
+            ingredient_ids.tolist(), np.split(pairs[:, 1], starts[1:])
+        ):
+            if len(posting) * c.COOK_INDEX_BITMAP_RATIO > len(sizes):
+                bitmap = np.zeros(len(sizes), dtype=bool)
+                bitmap[posting] = True
+                bitmaps[ingredient_id] = np.packbits(bitmap)
+            else:
+                postings[ingredient_id] = posting
+        with self.lock:
+            self.postings = postings
+            self.bitmaps = bitmaps
+            self.built_size = len(sizes)
+            self.sizes = sizes
+            self.stale = self.extra_ingredients = self.extra_recipes = EMPTY
+            self.built_at = self.synced_at = started
+        self.ready.set()
+
+    def run(self):
+        while True:
+            try:
+                self.build()
+            except Exception:
+                logger.exception('Не удалось построить индекс ингредиентов')
+            finally:
+                connections.close_all()
+            time.sleep(
+                c.COOK_INDEX_REBUILD_INTERVAL if self.ready.is_set()
+                else c.COOK_INDEX_RETRY_INTERVAL
+            )
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self.run, name='cook-index', daemon=True
+            )
+            self.thread.start()
+
+    def replace(self, recipe_ids, pairs=None):
+        recipe_ids = np.unique(np.asarray(recipe_ids, dtype=np.int64))
+        if pairs is None:
+            pairs = np.empty((0, 2), dtype=np.int64)
+        with self.lock:
+            kept = ~np.isin(self.extra_recipes, recipe_ids)
+            self.extra_ingredients = np.concatenate(
+                [self.extra_ingredients[kept], pairs[:, 0]]
+            )
+            self.extra_recipes = np.concatenate(
+                [self.extra_recipes[kept], pairs[:, 1]]
+            )
+            self.stale = np.union1d(self.stale, recipe_ids)
+            sizes = resized(
+                self.sizes, int(recipe_ids.max(initial=-1)) + 1
+            )
+            sizes[recipe_ids] = 0
+            np.add.at(sizes, pairs[:, 1], 1)
+            self.sizes = sizes
+
+    def discard(self, recipe_ids):
+        self.replace(recipe_ids)
+
+    def ensure_fresh(self):
+        from recipes.models import Recipe
+
+        if self.thread is not None:
+            if not self.ready.wait(c.COOK_INDEX_WAIT_TIMEOUT):
+                self.build()
+                return
+        elif self.built_at is None or (
+            timezone.now() - self.built_at
+            > timedelta(seconds=c.COOK_INDEX_REBUILD_INTERVAL)
+        ):
+            self.build()
+            return
+        now = timezone.now()
+        rows = list(Recipe.objects.filter(
+            updated_at__gte=self.synced_at - timedelta(
+                seconds=c.COOK_INDEX_SYNC_LAG
+            )
+        ).order_by().values_list('id', 'recipe_ingredients__ingredient_id'))
+        if rows:
+            self.replace(
+                [recipe_id for recipe_id, _ in rows],
+                load_pairs(
+                    (ingredient_id, recipe_id)
+                    for recipe_id, ingredient_id in rows
+                    if ingredient_id is not None
+                )
+            )
+        self.synced_at = now
+
+    def search(self, ingredients, limit):
+        self.ensure_fresh()
+        with self.lock:
+            postings, bitmaps = self.postings, self.bitmaps
+            built_size, sizes, stale = self.built_size, self.sizes, self.stale
+            extra_ingredients = self.extra_ingredients
+            extra_recipes = self.extra_recipes
+        ingredients = np.unique(np.asarray(ingredients, dtype=np.int64))
+        matched = np.zeros(len(sizes), dtype=np.uint8)
+        for ingredient_id in ingredients.tolist():
+            if ingredient_id in bitmaps:
+                matched[:built_size] += np.unpackbits(
+                    bitmaps[ingredient_id], count=built_size
+                )
+            elif ingredient_id in postings:
+                matched[postings[ingredient_id]] += 1
+        matched[stale] = 0
+        np.add.at(
+            matched, extra_recipes[np.isin(extra_ingredients, ingredients)], 1
+        )
+        missing = sizes - matched
+        missing[matched == 0] = UNMATCHED
+        if len(missing) > limit:
+            bound = np.partition(missing, limit - 1)[limit - 1]
+            recipe_ids = np.flatnonzero((missing <= bound) & (matched > 0))
+        else:
+            recipe_ids = np.flatnonzero(matched)
+        matched = matched[recipe_ids].astype(np.int32)
+        missing = missing[recipe_ids]
+        order = np.lexsort((recipe_ids, -matched, missing))[:limit]
+        return list(zip(
+            recipe_ids[order].tolist(), matched[order].tolist(),
+            missing[order].tolist()
+        ))
+
+
+cook_index = CookIndex()
@@ -0,0 +1,57 @@
+from bisect import bisect_left
+
+from recipes.reference_data import get_reference_version
+
+
+PREFIX_UPPER_BOUND = chr(0x10FFFF)
+
+
+class IngredientIndex:
+    def __init__(self):
+        self.version = None
+        self.keys = []
+        self.rows = []
+
+    def build(self, version):
+        from recipes.models import Ingredient
+
+        ingredients = Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit'
+        )
+        rows = sorted(
+            (
+                (name.casefold(), {
+                    'id': pk, 'name': name,
+                    'measurement_unit': measurement_unit,
+                })
+                for pk, name, measurement_unit in ingredients
+            ),
+            key=lambda item: (item[0], item[1]['id'])
+        )
+        self.keys = [key for key, _ in rows]
+        self.rows = [row for _, row in rows]
+        self.version = version
+
+    def ensure_fresh(self):
+        version = get_reference_version()
+        if version != self.version:
+            self.build(version)
+
+    def all(self):
+        self.ensure_fresh()
+        return self.rows
+
+    def search(self, name):
+        self.ensure_fresh()
+        keys, rows = self.keys, self.rows
+        prefix = name.casefold()
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + PREFIX_UPPER_BOUND, start)
+        contains = [
+            rows[position] for position, key in enumerate(keys)
+            if prefix in key and not key.startswith(prefix)
+        ]
+        return rows[start:end] + contains
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from foodgram.images import build_variants
+from recipes.models import Recipe
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Готовит уменьшенные копии изображений рецептов и аватаров, '
+        'для которых их ещё нет'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for model in (Recipe, User):
+            for field, variants_field in model.variant_fields.items():
+                rows = model.objects.exclude(
+                    **{f'{field}__isnull': True}
+                ).exclude(**{field: ''}).filter(
+                    **{variants_field: {}}
+                ).values_list('pk', field)
+                count = 0
+                for pk, name in rows.iterator(
+                    chunk_size=options['chunk_size']
+                ):
+                    build_variants(model, pk, field, name)
+                    count += 1
+                self.stdout.write(self.style.SUCCESS(
+                    f'{model._meta.verbose_name_plural}: '
+                    f'обработано изображений - {count}'
+                ))
@@ -0,0 +1,114 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from scipy import sparse
+
+from foodgram import constants as c
+from recipes.cook_index import load_pairs
+from recipes.models import Favorite, Recipe, ShoppingCart, SimilarRecipe
+
+
+def load_interactions(chunk_size):
+    return np.concatenate([
+        load_pairs(
+            model.objects.order_by().values_list('user_id', 'recipe_id')
+            .iterator(chunk_size=chunk_size)
+        )
+        for model in (Favorite, ShoppingCart)
+    ])
+
+
+def build_matrix(pairs, recipes_count, max_user_interactions):
+    _, users = np.unique(pairs[:, 0], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.int32), (users, pairs[:, 1])),
+        shape=(users.max(initial=-1) + 1, recipes_count)
+    )
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    interactions = np.diff(matrix.indptr)
+    return matrix[
+        (interactions >= 2) & (interactions <= max_user_interactions)
+    ]
+
+
+def top_neighbours(start, block, norms, top_k, min_common):
+    for row in range(block.shape[0]):
+        recipe_id = start + row
+        begin, end = block.indptr[row], block.indptr[row + 1]
+        similar = block.indices[begin:end]
+        common = block.data[begin:end]
+        selected = (similar != recipe_id) & (common >= min_common)
+        similar, common = similar[selected], common[selected]
+        if not len(similar):
+            continue
+        scores = common / (norms[recipe_id] * norms[similar])
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            similar, scores = similar[best], scores[best]
+        for similar_id, score in zip(similar.tolist(), scores.tolist()):
+            yield SimilarRecipe(
+                recipe_id=recipe_id, similar_id=similar_id, score=score
+            )
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит таблицу похожих рецептов по совместному добавлению '
+        'в избранное и список покупок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k', type=int, default=c.SIMILAR_RECIPES_LIMIT,
+            help='Число похожих рецептов, сохраняемых для каждого рецепта'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Число рецептов, обрабатываемых за один проход'
+        )
+        parser.add_argument(
+            '--max-user-interactions', type=int, default=1000,
+            help='Пользователи с большим числом рецептов не учитываются'
+        )
+        parser.add_argument(
+            '--min-common', type=int, default=1,
+            help='Минимальное число общих пользователей у пары рецептов'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        recipes_count = (
+            Recipe.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        ) + 1
+        matrix = build_matrix(
+            load_interactions(c.RECOMMENDATIONS_READ_CHUNK_SIZE),
+            recipes_count, options['max_user_interactions']
+        )
+        stored = self.build(matrix, options)
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты: сохранено {stored} записей '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
+
+    def build(self, matrix, options):
+        columns = matrix.tocsc()
+        norms = np.sqrt(np.diff(columns.indptr).astype(np.float64))
+        chunk_size = options['chunk_size']
+        stored = 0
+        for start in range(0, matrix.shape[1], chunk_size):
+            end = min(start + chunk_size, matrix.shape[1])
+            block = (columns[:, start:end].T @ matrix).tocsr()
+            with transaction.atomic():
+                SimilarRecipe.objects.filter(
+                    recipe_id__gte=start, recipe_id__lt=end
+                ).delete()
+                rows = SimilarRecipe.objects.bulk_create(top_neighbours(
+                    start, block, norms, options['top_k'],
+                    options['min_common']
+                ))
+            stored += len(rows)
+        return stored
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from foodgram import constants as c
+from foodgram.images import collect_images
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет изображения и их уменьшенные копии, на которые не '
+        'осталось ссылок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=c.IMAGE_COLLECT_GRACE,
+            help='Не трогать файлы, использованные за это число секунд'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено изображений: {collect_images(options["grace"])}'
+        ))
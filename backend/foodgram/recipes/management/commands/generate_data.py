@@ -0,0 +1,293 @@
+import csv
+import io
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from recipes.models import (
+    Favorite, FeedEntry, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    Tag
+)
+from users.models import Subscription
+
+
+User = get_user_model()
+
+RecipeTag = Recipe.tags.through
+
+DEFAULT_TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+)
+
+COPY_FIELDS = {
+    User: (
+        'id', 'username', 'email', 'first_name', 'last_name', 'password',
+        'is_active', 'is_staff', 'is_superuser', 'date_joined',
+        'recipes_count', 'subscribers_count', 'avatar_variants'
+    ),
+    Subscription: ('subscriber_id', 'author_id'),
+    Recipe: (
+        'id', 'author_id', 'name', 'description', 'time_to_cook',
+        'favorites_count', 'updated_at', 'trending_score', 'pic_variants'
+    ),
+    RecipeTag: ('recipe_id', 'tag_id'),
+    RecipeIngredient: ('recipe_id', 'ingredient_id', 'amount'),
+    Favorite: ('user_id', 'recipe_id', 'created_at'),
+    ShoppingCart: ('user_id', 'recipe_id', 'created_at'),
+}
+
+
+class ZipfSampler:
+    def __init__(self, rng, population, exponent):
+        self.rng = rng
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent
+            for rank in range(1, len(self.population) + 1)
+        ))
+
+    def choices(self, count):
+        return self.rng.choices(
+            self.population, cum_weights=self.cum_weights, k=count
+        )
+
+    def sample(self, count, exclude=None):
+        count = min(count, len(self.population) - (exclude is not None))
+        picked = set()
+        while len(picked) < count:
+            picked.update(self.rng.choices(
+                self.population, cum_weights=self.cum_weights,
+                k=count - len(picked)
+            ))
+            picked.discard(exclude)
+        return sorted(picked)
+
+
+def next_id(model):
+    return (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def copy_rows(model, fields, rows):
+    columns = ', '.join(
+        connection.ops.quote_name(model._meta.get_field(name).column)
+        for name in fields
+    )
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {connection.ops.quote_name(model._meta.db_table)} '
+            f'({columns}) FROM STDIN WITH (FORMAT csv)',
+            buffer
+        )
+
+
+def write_rows(model, fields, rows, chunk_size, use_copy):
+    written = 0
+    for chunk in chunked(rows, chunk_size):
+        if use_copy:
+            copy_rows(model, fields, chunk)
+        else:
+            model.objects.bulk_create(
+                [model(**dict(zip(fields, row))) for row in chunk],
+                batch_size=chunk_size
+            )
+        written += len(chunk)
+    return written
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетический набор данных: пользователей, подписки, '
+        'рецепты, избранное и списки покупок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument(
+            '--subscriptions', type=int, default=10,
+            help='Среднее число подписок на пользователя'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Среднее число избранных рецептов на пользователя'
+        )
+        parser.add_argument(
+            '--cart', type=int, default=5,
+            help='Среднее число рецептов в списке покупок на пользователя'
+        )
+        parser.add_argument(
+            '--days', type=int, default=30,
+            help='За сколько последних дней распределить добавления '
+                 'в избранное и список покупок'
+        )
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help='Показатель распределения Ципфа для популярности '
+                 'авторов и рецептов (0 - равномерное)'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--password', default='password',
+            help='Пароль для всех сгенерированных пользователей'
+        )
+        parser.add_argument('--chunk-size', type=int, default=10000)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY на PostgreSQL'
+        )
+
+    def log(self, message):
+        self.stdout.write(f'[{time.monotonic() - self.started:.1f} с] '
+                          f'{message}')
+
+    def handle(self, *args, **options):
+        self.started = time.monotonic()
+        rng = random.Random(options['seed'])
+        chunk_size = options['chunk_size']
+        use_copy = (
+            connection.vendor == 'postgresql' and not options['no_copy']
+        )
+        if not Ingredient.objects.exists():
+            call_command('import_csv_data', stdout=self.stdout)
+        for name, slug in DEFAULT_TAGS:
+            Tag.objects.get_or_create(slug=slug, defaults={'name': name})
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+
+        def write(model, rows):
+            return write_rows(
+                model, COPY_FIELDS[model], rows, chunk_size, use_copy
+            )
+
+        with transaction.atomic():
+            first_user = next_id(User)
+            user_ids = range(first_user, first_user + options['users'])
+            password = make_password(options['password'])
+            now = timezone.now()
+            count = write(
+                User,
+                (
+                    (user_id, f'user_{user_id}', f'user_{user_id}@example.com',
+                     'Имя', f'Фамилия {user_id}', password, True, False,
+                     False, now, 0, 0, {})
+                    for user_id in user_ids
+                )
+            )
+            self.log(f'Пользователи: {count}')
+
+            authors = ZipfSampler(rng, user_ids, options['skew'])
+            count = write(
+                Subscription,
+                (
+                    (user_id, author_id)
+                    for user_id in user_ids
+                    for author_id in authors.sample(
+                        rng.randint(0, 2 * options['subscriptions']),
+                        exclude=user_id
+                    )
+                )
+            )
+            self.log(f'Подписки: {count}')
+
+            first_recipe = next_id(Recipe)
+            recipe_ids = range(first_recipe, first_recipe + options['recipes'])
+            count = write(
+                Recipe,
+                (
+                    (recipe_id, author_id, f'Рецепт {recipe_id}',
+                     f'Описание рецепта {recipe_id}', rng.randint(1, 180),
+                     0, now, 0.0, {})
+                    for recipe_id, author_id in zip(
+                        recipe_ids,
+                        authors.choices(len(recipe_ids))
+                    )
+                )
+            )
+            self.log(f'Рецепты: {count}')
+
+            count = write(
+                RecipeTag,
+                (
+                    (recipe_id, tag_id)
+                    for recipe_id in recipe_ids
+                    for tag_id in rng.sample(
+                        tag_ids, min(options['tags_per_recipe'], len(tag_ids))
+                    )
+                )
+            )
+            self.log(f'Теги рецептов: {count}')
+
+            count = write(
+                RecipeIngredient,
+                (
+                    (recipe_id, ingredient_id, rng.randint(1, 500))
+                    for recipe_id in recipe_ids
+                    for ingredient_id in rng.sample(
+                        ingredient_ids,
+                        min(options['ingredients_per_recipe'],
+                            len(ingredient_ids))
+                    )
+                )
+            )
+            self.log(f'Ингредиенты рецептов: {count}')
+
+            recipes = ZipfSampler(rng, recipe_ids, options['skew'])
+            period = options['days'] * 24 * 60 * 60
+            for model, average in (
+                (Favorite, options['favorites']),
+                (ShoppingCart, options['cart']),
+            ):
+                count = write(
+                    model,
+                    (
+                        (user_id, recipe_id,
+                         now - timedelta(seconds=rng.uniform(0, period)))
+                        for user_id in user_ids
+                        for recipe_id in recipes.sample(
+                            rng.randint(0, 2 * average)
+                        )
+                    )
+                )
+                self.log(f'{model._meta.verbose_name_plural}: {count}')
+
+            self.reset_sequences()
+            call_command('recalculate_counters', stdout=self.stdout)
+            call_command(
+                'rebuild_shopping_totals', force=True, stdout=self.stdout
+            )
+            FeedEntry.objects.rebuild()
+            self.log(f'Записи лент: {FeedEntry.objects.count()}')
+            call_command('refresh_trending', full=True, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Данные успешно сгенерированы'))
+
+    def reset_sequences(self):
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Recipe]
+        )
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
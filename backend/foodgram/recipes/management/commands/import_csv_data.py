@@ -5,6 +5,7 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 
 from recipes.models import Ingredient
+from recipes.reference_data import invalidate_reference_data
 
 DATA_DIR = os.path.join(settings.BASE_DIR, 'data')
 INGREDIENTS_FILE = os.path.join(DATA_DIR, 'ingredients.csv')
@@ -33,6 +34,7 @@ class Command(BaseCommand):
                 Ingredient.objects.bulk_create(
                     ingredients, ignore_conflicts=True
                 )
+                invalidate_reference_data()
             self.stdout.write(self.style.SUCCESS(
                 'Ингредиенты успешно импортированы'
             ))
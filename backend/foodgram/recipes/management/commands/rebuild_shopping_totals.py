@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from recipes.models import ShoppingCart, ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет итоговые списки покупок пользователей с содержимым '
+        'корзин и пересобирает расходящиеся'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, nargs='+',
+            help='Пересобрать списки только указанных пользователей'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перезаписать списки всех пользователей, '
+                 'а не только расходящиеся'
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        totals = ShoppingCartIngredient.objects
+        if options['users']:
+            chunks = [options['users']]
+        else:
+            max_id = max(
+                ShoppingCart.objects.aggregate(max_id=Max('user_id'))[
+                    'max_id'] or 0,
+                totals.aggregate(max_id=Max('user_id'))['max_id'] or 0
+            )
+            chunk_size = options['chunk_size']
+            chunks = (
+                range(start, start + chunk_size)
+                for start in range(0, max_id + 1, chunk_size)
+            )
+        fixed = 0
+        for user_ids in chunks:
+            fixed += len(totals.rebuild(user_ids, options['force']))
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок: исправлено пользователей - {fixed}'
+        ))
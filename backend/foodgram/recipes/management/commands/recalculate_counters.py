@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import F, Max, Q
+
+from recipes.models import Favorite, Recipe
+from users.models import Subscription, count_subquery
+
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, {'favorites_count': (Favorite, 'recipe')}),
+    (User, {
+        'recipes_count': (Recipe, 'author'),
+        'subscribers_count': (Subscription, 'author'),
+    }),
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        for model, counters in COUNTERS:
+            max_id = model.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+            fixed = 0
+            for start in range(0, max_id + 1, chunk_size):
+                actual = {
+                    f'actual_{field}': count_subquery(*source)
+                    for field, source in counters.items()
+                }
+                drift = Q()
+                for field in counters:
+                    drift |= ~Q(**{field: F(f'actual_{field}')})
+                ids = list(
+                    model.objects.filter(
+                        id__gte=start, id__lt=start + chunk_size
+                    ).annotate(**actual).filter(drift)
+                    .values_list('id', flat=True)
+                )
+                if ids:
+                    model.objects.filter(id__in=ids).refresh_counters()
+                    fixed += len(ids)
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: '
+                f'исправлено записей - {fixed}'
+            ))
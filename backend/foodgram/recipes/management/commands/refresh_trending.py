@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from foodgram import constants as c
+from recipes.trending import refresh_trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Учитывает новые добавления в избранное и список покупок '
+        'в рейтинге популярности рецептов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=c.TRENDING_CHUNK_SIZE
+        )
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать популярность заново с учётом удалений'
+        )
+
+    def handle(self, *args, **options):
+        count = refresh_trending(options['chunk_size'], options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Популярность: обновлено рецептов - {count}'
+        ))
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.3 on 2026-10-17 02:01
+
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_alter_recipeingredient_amount'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(django.db.models.functions.text.Lower('name'), django.db.models.expressions.F('id'), name='recipe_lower_name_id_idx'),
+        ),
+    ]
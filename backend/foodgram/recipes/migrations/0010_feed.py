@@ -0,0 +1,64 @@
+# Generated by Django 3.2.3 on 2026-10-17 02:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+FEED_FANOUT_MAX_SUBSCRIBERS = 10000
+
+
+def fill_feed(apps, schema_editor):
+    Subscription = apps.get_model('users', 'Subscription')
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe_id=recipe_id)
+            for user_id, recipe_id in Subscription.objects.filter(
+                author__subscribers_count__lte=FEED_FANOUT_MAX_SUBSCRIBERS,
+                author__recipes__isnull=False
+            ).values_list('subscriber_id', 'author__recipes__id').iterator()
+        ),
+        batch_size=5000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_shopping_cart_totals'),
+        ('users', '0008_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи ленты',
+                'default_related_name': 'feed_entries',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-id'], name='recipe_author_id_idx'),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_recipe_feed'),
+        ),
+        migrations.RunPython(fill_feed, migrations.RunPython.noop),
+    ]
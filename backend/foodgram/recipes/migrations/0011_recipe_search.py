@@ -0,0 +1,76 @@
+# Generated by Django 3.2.3 on 2026-10-17 02:30
+
+from django.db import migrations
+
+
+POSTGRESQL_FORWARD = (
+    'ALTER TABLE recipes_recipe ADD COLUMN IF NOT EXISTS search_vector '
+    'tsvector',
+    '''
+    CREATE OR REPLACE FUNCTION recipes_recipe_search_vector_update()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A')
+            || setweight(
+                to_tsvector('russian', coalesce(NEW.description, '')), 'B'
+            );
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger '
+    'ON recipes_recipe',
+    'CREATE TRIGGER recipes_recipe_search_vector_trigger '
+    'BEFORE INSERT OR UPDATE OF name, description ON recipes_recipe '
+    'FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector_update()',
+    'UPDATE recipes_recipe SET name = name',
+    'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+    'ON recipes_recipe USING gin (search_vector)',
+)
+
+POSTGRESQL_BACKWARD = (
+    'DROP INDEX IF EXISTS recipe_search_vector_idx',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger '
+    'ON recipes_recipe',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update()',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+)
+
+SQLITE_FORWARD = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts '
+    'USING fts5(name, description)',
+    'INSERT INTO recipes_recipe_fts (rowid, name, description) '
+    'SELECT id, name, description FROM recipes_recipe',
+)
+
+SQLITE_BACKWARD = (
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({
+                'postgresql': POSTGRESQL_FORWARD,
+                'sqlite': SQLITE_FORWARD,
+            }),
+            run({
+                'postgresql': POSTGRESQL_BACKWARD,
+                'sqlite': SQLITE_BACKWARD,
+            }),
+        ),
+    ]
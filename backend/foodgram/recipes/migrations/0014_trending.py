@@ -0,0 +1,46 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_similar_recipes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.CreateModel(
+            name='TrendingState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Точка отсчёта')),
+                ('favorite_watermark', models.PositiveBigIntegerField(default=0, verbose_name='Последняя учтённая запись избранного')),
+                ('shopping_cart_watermark', models.PositiveBigIntegerField(default=0, verbose_name='Последняя учтённая запись списка покупок')),
+            ],
+            options={
+                'verbose_name': 'Состояние популярности',
+                'verbose_name_plural': 'Состояние популярности',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending_score', 'id'], name='recipe_trending_idx'),
+        ),
+    ]
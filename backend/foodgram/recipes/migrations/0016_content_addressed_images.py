@@ -0,0 +1,19 @@
+# Generated by Django 3.2.3 on 2026-10-17 02:41
+
+from django.db import migrations
+import foodgram.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='pic',
+            field=foodgram.storage.ContentImageField(blank=True, db_index=True, help_text='Загрузите изображение рецепта', null=True, storage=foodgram.storage.ContentAddressedStorage(), upload_to='recipe_pics/', verbose_name='Изображение'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.3 on 2026-10-17 02:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeClicks',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.PositiveBigIntegerField(default=0, verbose_name='Переходы по короткой ссылке')),
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='clicks', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Переходы по ссылке',
+                'verbose_name_plural': 'Переходы по ссылкам',
+            },
+        ),
+    ]
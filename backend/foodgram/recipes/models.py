@@ -1,12 +1,22 @@
+from collections import Counter, defaultdict
+
 from django.contrib.auth import get_user_model
-from django.contrib import admin
 from django.core.validators import MinValueValidator
-from django.db import models
-from django.db.models import UniqueConstraint
-from django.db.models.functions import Lower
+from django.db import connection, models, transaction
+from django.db.models import (
+    Exists, F, OuterRef, Prefetch, Sum, UniqueConstraint, Window
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower, RowNumber
+from django.utils import timezone
 
 from foodgram import constants as c
-from recipes.service import generate_unique_short_link
+from foodgram.counters import CounterFieldsMixin
+from foodgram.images import ImageVariantsMixin
+from foodgram.storage import ContentImageField
+from recipes.search import index_recipes
+from recipes.service import encode_short_link
+from users.models import Subscription, count_subquery
 
 
 User = get_user_model()
@@ -63,7 +73,79 @@ class Ingredient(models.Model):
         return f'{self.name} ({self.measurement_unit})'
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    def touch(self):
+        return self.update(updated_at=timezone.now())
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            User.objects.filter(
+                pk__in={obj.author_id for obj in objs}
+            ).refresh_counters()
+            FeedEntry.objects.fan_out(objs)
+            index_recipes(obj.pk for obj in objs if obj.pk)
+        return created
+
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        )
+
+    def with_author(self, user):
+        authors = User.objects.all()
+        if user.is_authenticated:
+            authors = authors.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(
+                    subscriber=user, author=OuterRef('pk')
+                )
+            ))
+        return self.prefetch_related(Prefetch('author', queryset=authors))
+
+    def refresh_counters(self):
+        return self.update(
+            favorites_count=count_subquery(Favorite, 'recipe')
+        )
+
+    def limit_per_author(self, limit):
+        ranked = self.annotate(author_rank=Window(
+            RowNumber(), partition_by=F('author_id'),
+            order_by=[Lower('name').asc(), F('pk').asc()]
+        )).order_by().values('pk', 'author_rank')
+        sql, params = ranked.query.sql_with_params()
+        qn = connection.ops.quote_name
+        return self.filter(pk__in=RawSQL(
+            f'SELECT {qn("id")} FROM ({sql}) {qn("ranked")} '
+            f'WHERE {qn("author_rank")} <= %s',
+            (*params, limit)
+        ))
+
+    def with_contents(self):
+        return self.prefetch_related(*get_contents_lookups())
+
+    def with_related(self, user):
+        return self.with_author(user).with_contents()
+
+
+def get_contents_lookups():
+    return (
+        'tags',
+        Prefetch(
+            'recipe_ingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        ),
+    )
+
+
+class Recipe(ImageVariantsMixin, CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -77,13 +159,19 @@ class Recipe(models.Model):
         verbose_name='Название',
         help_text='Введите название рецепта'
     )
-    pic = models.ImageField(
+    pic = ContentImageField(
         upload_to='recipe_pics/',
         blank=True,
         null=True,
         verbose_name='Изображение',
         help_text='Загрузите изображение рецепта'
     )
+    pic_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Варианты изображения'
+    )
     description = models.TextField(
         verbose_name='Описание',
         help_text='Введите описание рецепта'
@@ -114,23 +202,111 @@ class Recipe(models.Model):
         verbose_name='Короткая ссылка',
         help_text='Короткий идентификатор рецепта'
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество в избранном'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    trending_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Популярность'
+    )
+
+    objects = RecipeQuerySet.as_manager()
+    counter_fields = ('favorites_count',)
+    computed_fields = ('trending_score', 'pic_variants')
+    variant_fields = {'pic': 'pic_variants'}
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = (Lower('name'),)
+        indexes = [
+            models.Index(Lower('name'), 'id', name='recipe_lower_name_id_idx'),
+            models.Index(
+                fields=['author', '-id'], name='recipe_author_id_idx'
+            ),
+            models.Index(
+                fields=['updated_at'], name='recipe_updated_at_idx'
+            ),
+            models.Index(
+                fields=['-trending_score', 'id'], name='recipe_trending_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
-        if not self.short_link:
-            self.short_link = generate_unique_short_link()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def get_short_link(self):
+        return self.short_link or encode_short_link(self.pk)
+
+    get_short_link.short_description = 'Короткая ссылка'
+
+    def clicks_total(self):
+        clicks = getattr(self, 'clicks', None)
+        return clicks.total if clicks else 0
 
-    @admin.display(description='Количество в избранном')
-    def favorites_count(self):
-        return self.favorites.count()
+    clicks_total.short_description = 'Переходы по ссылке'
+    clicks_total.admin_order_field = 'clicks__total'
+
+
+class RecipeIngredientQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            Recipe.objects.filter(
+                pk__in={obj.recipe_id for obj in objs}
+            ).touch()
+            ShoppingCartIngredient.objects.apply_recipe_changes(
+                (obj.recipe_id, obj.ingredient_id, obj.amount)
+                for obj in objs
+            )
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            changes = [
+                (recipe_id, ingredient_id, -amount)
+                for recipe_id, ingredient_id, amount in self.filter(
+                    pk__in=[obj.pk for obj in objs]
+                ).values_list('recipe_id', 'ingredient_id', 'amount')
+            ]
+            updated = super().bulk_update(objs, fields, *args, **kwargs)
+            changes.extend(
+                (obj.recipe_id, obj.ingredient_id, obj.amount)
+                for obj in objs
+            )
+            Recipe.objects.filter(
+                pk__in={obj.recipe_id for obj in objs}
+            ).touch()
+            ShoppingCartIngredient.objects.apply_recipe_changes(changes)
+        return updated
+
+    def bulk_delete(self):
+        with transaction.atomic(using=self.db):
+            objs = list(
+                self.values_list('recipe_id', 'ingredient_id', 'amount')
+            )
+            deleted = self._raw_delete(self.db)
+            Recipe.objects.filter(
+                pk__in={recipe_id for recipe_id, _, _ in objs}
+            ).touch()
+            ShoppingCartIngredient.objects.apply_recipe_changes(
+                (recipe_id, ingredient_id, -amount)
+                for recipe_id, ingredient_id, amount in objs
+            )
+        return deleted
 
 
 class RecipeIngredient(models.Model):
@@ -151,6 +327,8 @@ class RecipeIngredient(models.Model):
         help_text='Введите количество ингредиента'
     )
 
+    objects = RecipeIngredientQuerySet.as_manager()
+
     class Meta:
         default_related_name = 'recipe_ingredients'
         verbose_name = 'Ингредиент рецепта'
@@ -169,6 +347,36 @@ class RecipeIngredient(models.Model):
         )
 
 
+def refresh_favorite_counters(objs):
+    Recipe.objects.filter(
+        pk__in={obj.recipe_id for obj in objs}
+    ).refresh_counters()
+
+
+def rebuild_cart_totals(objs):
+    ShoppingCartIngredient.objects.rebuild({obj.user_id for obj in objs})
+
+
+class UserRecipeQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            self.refresh_related(objs)
+        return created
+
+    def bulk_delete(self):
+        with transaction.atomic(using=self.db):
+            objs = list(self.only('user_id', 'recipe_id'))
+            deleted = self._raw_delete(self.db)
+            self.refresh_related(objs)
+        return deleted
+
+
+class FavoriteQuerySet(UserRecipeQuerySet):
+    refresh_related = staticmethod(refresh_favorite_counters)
+
+
 class Favorite(models.Model):
     user = models.ForeignKey(
         User,
@@ -182,6 +390,12 @@ class Favorite(models.Model):
         verbose_name='Рецепт',
         help_text='Рецепт, который добавлен в избранное'
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
+
+    objects = FavoriteQuerySet.as_manager()
 
     class Meta:
         default_related_name = 'favorites'
@@ -197,6 +411,14 @@ class Favorite(models.Model):
     def __str__(self):
         return f'{self.user.username} добавил {self.recipe.name} в избранное'
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class ShoppingCartQuerySet(UserRecipeQuerySet):
+    refresh_related = staticmethod(rebuild_cart_totals)
+
 
 class ShoppingCart(models.Model):
     user = models.ForeignKey(
@@ -211,6 +433,12 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт',
         help_text='Рецепт, который добавлен в список покупок'
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
+
+    objects = ShoppingCartQuerySet.as_manager()
 
     class Meta:
         default_related_name = 'shopping_cart'
@@ -227,3 +455,318 @@ class ShoppingCart(models.Model):
         return (
             f'{self.user.username} добавил {self.recipe.name} в список покупок'
         )
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class ShoppingCartIngredientQuerySet(models.QuerySet):
+    def apply_deltas(self, user_ids, deltas):
+        user_ids = list(user_ids)
+        deltas = {
+            ingredient_id: amount
+            for ingredient_id, amount in deltas.items() if amount
+        }
+        if not user_ids or not deltas:
+            return
+        with transaction.atomic(using=self.db):
+            self.bulk_create(
+                (
+                    ShoppingCartIngredient(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        amount=0
+                    )
+                    for user_id in user_ids
+                    for ingredient_id, amount in deltas.items()
+                    if amount > 0
+                ),
+                ignore_conflicts=True
+            )
+            rows = self.filter(user_id__in=user_ids, ingredient_id__in=deltas)
+            by_amount = defaultdict(list)
+            for ingredient_id, amount in deltas.items():
+                by_amount[amount].append(ingredient_id)
+            for amount, ingredient_ids in by_amount.items():
+                rows.filter(ingredient_id__in=ingredient_ids).update(
+                    amount=F('amount') + amount
+                )
+            rows.filter(amount__lte=0).delete()
+
+    def apply_cart_changes(self, user_id, recipe_ids, sign=1):
+        deltas = Counter()
+        for ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id', 'amount'):
+            deltas[ingredient_id] += sign * amount
+        self.apply_deltas([user_id], deltas)
+
+    def apply_recipe_changes(self, changes):
+        deltas = defaultdict(Counter)
+        for recipe_id, ingredient_id, amount in changes:
+            deltas[recipe_id][ingredient_id] += amount
+        if not deltas:
+            return
+        carts = defaultdict(list)
+        for recipe_id, user_id in ShoppingCart.objects.filter(
+            recipe_id__in=deltas
+        ).values_list('recipe_id', 'user_id'):
+            carts[recipe_id].append(user_id)
+        for recipe_id, user_ids in carts.items():
+            self.apply_deltas(user_ids, deltas[recipe_id])
+
+    def get_expected(self, user_ids):
+        return RecipeIngredient.objects.filter(
+            recipe__shopping_cart__user_id__in=user_ids
+        ).values_list(
+            'recipe__shopping_cart__user_id', 'ingredient_id'
+        ).annotate(total=Sum('amount')).order_by()
+
+    def rebuild(self, user_ids, force=False):
+        user_ids = list(user_ids)
+        with transaction.atomic(using=self.db):
+            expected = {
+                row for row in self.get_expected(user_ids) if row[2] > 0
+            }
+            actual = set(self.filter(user_id__in=user_ids).values_list(
+                'user_id', 'ingredient_id', 'amount'
+            ))
+            drifted = {user_id for user_id, _, _ in expected ^ actual}
+            rebuilt = set(user_ids) if force else drifted
+            if rebuilt:
+                self.filter(user_id__in=rebuilt).delete()
+                self.bulk_create(
+                    ShoppingCartIngredient(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        amount=amount
+                    )
+                    for user_id, ingredient_id, amount in expected
+                    if user_id in rebuilt
+                )
+        return drifted
+
+
+class ShoppingCartIngredient(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(verbose_name='Количество')
+
+    objects = ShoppingCartIngredientQuerySet.as_manager()
+
+    class Meta:
+        default_related_name = 'shopping_cart_ingredients'
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_ingredient_shopping_cart'
+            )
+        ]
+
+    def __str__(self):
+        return (
+            f'{self.amount} {self.ingredient.measurement_unit} '
+            f'{self.ingredient.name} для {self.user.username}'
+        )
+
+
+class FeedEntryQuerySet(models.QuerySet):
+    def add_entries(self, entries):
+        self.bulk_create(
+            (
+                FeedEntry(user_id=user_id, recipe_id=recipe_id)
+                for user_id, recipe_id in entries
+            ),
+            batch_size=c.FEED_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+
+    def fan_out(self, recipes):
+        recipes = [recipe for recipe in recipes if recipe.pk]
+        subscribers = defaultdict(list)
+        for author_id, subscriber_id in Subscription.objects.filter(
+            author_id__in={recipe.author_id for recipe in recipes},
+            author__subscribers_count__lte=c.FEED_FANOUT_MAX_SUBSCRIBERS
+        ).values_list('author_id', 'subscriber_id'):
+            subscribers[author_id].append(subscriber_id)
+        self.add_entries(
+            (subscriber_id, recipe.pk)
+            for recipe in recipes
+            for subscriber_id in subscribers[recipe.author_id]
+        )
+
+    def backfill(self, subscriptions):
+        subscribers = defaultdict(list)
+        for subscriber_id, author_id in subscriptions:
+            subscribers[author_id].append(subscriber_id)
+        recipes = Recipe.objects.filter(
+            author_id__in=subscribers,
+            author__subscribers_count__lte=c.FEED_FANOUT_MAX_SUBSCRIBERS
+        ).order_by().values_list('author_id', 'id')
+        self.add_entries(
+            (subscriber_id, recipe_id)
+            for author_id, recipe_id in recipes.iterator()
+            for subscriber_id in subscribers[author_id]
+        )
+
+    def prune(self, subscriber_id, author_id):
+        return self.filter(
+            user_id=subscriber_id, recipe__author_id=author_id
+        ).delete()
+
+    def rebuild(self, user_ids=None):
+        entries = self.all()
+        subscriptions = Subscription.objects.all()
+        if user_ids is not None:
+            entries = entries.filter(user_id__in=user_ids)
+            subscriptions = subscriptions.filter(subscriber_id__in=user_ids)
+        with transaction.atomic(using=self.db):
+            entries.delete()
+            self.backfill(
+                subscriptions.values_list('subscriber_id', 'author_id')
+            )
+
+    def get_sources(self, user):
+        return (
+            (self.filter(user=user).values_list('recipe_id', flat=True),
+             'recipe_id'),
+            (Recipe.objects.filter(author__in=Subscription.objects.filter(
+                subscriber=user,
+                author__subscribers_count__gt=c.FEED_FANOUT_MAX_SUBSCRIBERS
+            ).values('author_id')).values_list('id', flat=True), 'id'),
+        )
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+
+    objects = FeedEntryQuerySet.as_manager()
+
+    class Meta:
+        default_related_name = 'feed_entries'
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_user_recipe_feed'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe.name} в ленте {self.user.username}'
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similarities',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_recipe_similar'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'], name='similar_recipe_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.similar.name} похож на {self.recipe.name}'
+
+
+class TrendingState(models.Model):
+    epoch = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Точка отсчёта'
+    )
+    favorite_watermark = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Последняя учтённая запись избранного'
+    )
+    shopping_cart_watermark = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Последняя учтённая запись списка покупок'
+    )
+
+    class Meta:
+        verbose_name = 'Состояние популярности'
+        verbose_name_plural = 'Состояние популярности'
+
+
+class RecipeClicksQuerySet(models.QuerySet):
+    def add(self, counts):
+        rows = [
+            (recipe_id, counts[recipe_id]) for recipe_id in
+            Recipe.objects.filter(pk__in=counts).values_list('pk', flat=True)
+        ]
+        if not rows:
+            return 0
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        total = qn('total')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({qn("recipe_id")}, {total}) '
+                f'VALUES {", ".join(["(%s, %s)"] * len(rows))} '
+                f'ON CONFLICT ({qn("recipe_id")}) DO UPDATE '
+                f'SET {total} = {table}.{total} + excluded.{total}',
+                [value for row in rows for value in row]
+            )
+        return len(rows)
+
+
+class RecipeClicks(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='clicks',
+        verbose_name='Рецепт'
+    )
+    total = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Переходы по короткой ссылке'
+    )
+
+    objects = RecipeClicksQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Переходы по ссылке'
+        verbose_name_plural = 'Переходы по ссылкам'
+
+    def __str__(self):
+        return f'{self.recipe.name}: {self.total}'
@@ -0,0 +1,57 @@
+import gzip
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+
+
+REFERENCE_VERSION_KEY = 'reference-data-version'
+
+
+def get_reference_version():
+    version = cache.get(REFERENCE_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(REFERENCE_VERSION_KEY, version, None)
+    return version
+
+
+def invalidate_reference_data():
+    try:
+        cache.incr(REFERENCE_VERSION_KEY)
+    except ValueError:
+        cache.set(REFERENCE_VERSION_KEY, time.time_ns(), None)
+
+
+class ReferenceSnapshot:
+    def __init__(self):
+        self.version = None
+        self.content = b''
+        self.compressed = b''
+        self.content_hash = ''
+
+    def build(self, version):
+        from recipes.ingredient_index import ingredient_index
+        from recipes.models import Tag
+
+        content = json.dumps(
+            {
+                'tags': list(Tag.objects.values('id', 'name', 'slug')),
+                'ingredients': ingredient_index.all(),
+            },
+            ensure_ascii=False, separators=(',', ':')
+        ).encode()
+        self.content = content
+        self.compressed = gzip.compress(content, mtime=0)
+        self.content_hash = hashlib.sha256(content).hexdigest()[:32]
+        self.version = version
+
+    def ensure_fresh(self):
+        version = get_reference_version()
+        if version != self.version:
+            self.build(version)
+        return self
+
+
+reference_snapshot = ReferenceSnapshot()
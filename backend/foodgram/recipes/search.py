@@ -0,0 +1,77 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+from foodgram import constants as c
+
+
+RECIPE_TABLE = 'recipes_recipe'
+
+FTS_TABLE = 'recipes_recipe_fts'
+
+
+def get_terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def execute_for_ids(sql, recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if connection.vendor != 'sqlite' or not recipe_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(placeholders=placeholders), recipe_ids)
+
+
+def unindex_recipes(recipe_ids):
+    execute_for_ids(
+        f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({{placeholders}})',
+        recipe_ids
+    )
+
+
+def index_recipes(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    unindex_recipes(recipe_ids)
+    execute_for_ids(
+        f'INSERT INTO {FTS_TABLE} (rowid, name, description) '
+        f'SELECT id, name, description FROM {RECIPE_TABLE} '
+        f'WHERE id IN ({{placeholders}})',
+        recipe_ids
+    )
+
+
+def search_recipes(queryset, query):
+    terms = get_terms(query)
+    if not terms:
+        return queryset.none()
+    if connection.vendor == 'postgresql':
+        tsquery = 'websearch_to_tsquery(%s::regconfig, %s)'
+        params = (c.SEARCH_CONFIG, query)
+        match = RawSQL(
+            f'"{RECIPE_TABLE}"."search_vector" @@ {tsquery}', params,
+            output_field=BooleanField()
+        )
+        rank = RawSQL(
+            f'ts_rank("{RECIPE_TABLE}"."search_vector", {tsquery})', params,
+            output_field=FloatField()
+        )
+    else:
+        match_query = ' '.join(f'"{term}"*' for term in terms)
+        match = RawSQL(
+            f'"{RECIPE_TABLE}"."id" IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)', (match_query,),
+            output_field=BooleanField()
+        )
+        rank = RawSQL(
+            f'(SELECT -bm25({FTS_TABLE}, %s, %s) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'AND rowid = "{RECIPE_TABLE}"."id")',
+            (c.SEARCH_NAME_WEIGHT, c.SEARCH_DESCRIPTION_WEIGHT, match_query),
+            output_field=FloatField()
+        )
+    return queryset.filter(match).annotate(search_rank=rank).order_by(
+        '-search_rank', 'pk'
+    )
@@ -1,12 +1,69 @@
-from django.utils.crypto import get_random_string
+import hashlib
+import string
+from functools import lru_cache
+
+from django.conf import settings
 
 from foodgram import constants as c
 
 
-def generate_unique_short_link():
+ALPHABET = string.digits + string.ascii_letters
+
+DOMAIN = len(ALPHABET) ** c.SHORT_LINK_CODE_LENGTH
+
+HALF_BITS = (DOMAIN.bit_length() + 1) // 2
+
+HALF_MASK = (1 << HALF_BITS) - 1
+
+
+def round_value(number, value):
+    digest = hashlib.blake2b(
+        value.to_bytes(8, 'big'), digest_size=8,
+        key=settings.SHORT_LINK_KEY.encode()[:64],
+        person=number.to_bytes(16, 'big')
+    ).digest()
+    return int.from_bytes(digest, 'big') & HALF_MASK
+
+
+def feistel(value, rounds):
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for number in rounds:
+        left, right = right, left ^ round_value(number, right)
+    return right << HALF_BITS | left
+
+
+def permute(value, rounds):
+    value = feistel(value, rounds)
+    while value >= DOMAIN:
+        value = feistel(value, rounds)
+    return value
+
+
+def encode_short_link(recipe_id):
+    value = permute(recipe_id, range(c.SHORT_LINK_ROUNDS))
+    chars = []
+    for _ in range(c.SHORT_LINK_CODE_LENGTH):
+        value, index = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[index])
+    return ''.join(reversed(chars))
+
+
+def decode_short_link(short_link):
+    if len(short_link) != c.SHORT_LINK_CODE_LENGTH:
+        return None
+    value = 0
+    for char in short_link:
+        index = ALPHABET.find(char)
+        if index < 0:
+            return None
+        value = value * len(ALPHABET) + index
+    return permute(value, range(c.SHORT_LINK_ROUNDS - 1, -1, -1))
+
+
+@lru_cache(maxsize=c.SHORT_LINK_CACHE_SIZE)
+def resolve_stored_short_link(short_link):
     from recipes.models import Recipe
 
-    while True:
-        candidate = get_random_string(c.SHORT_LINK_LENGTH)
-        if not Recipe.objects.filter(short_link=candidate).exists():
-            return candidate
+    return Recipe.objects.filter(short_link=short_link).values_list(
+        'id', flat=True
+    ).first()
@@ -0,0 +1,193 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_save
+)
+from django.db import transaction
+from django.dispatch import receiver
+
+from foodgram import constants as c
+from foodgram.counters import change_counter
+from foodgram.images import variants_ready
+from recipes.models import (
+    Favorite, FeedEntry, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingCartIngredient, Tag
+)
+from recipes.reference_data import invalidate_reference_data
+from recipes.search import index_recipes, unindex_recipes
+from users.models import Subscription
+
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            Recipe.objects.filter(pk=instance.recipe_id), 'favorites_count', 1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(sender, instance, **kwargs):
+    change_counter(
+        Recipe.objects.filter(pk=instance.recipe_id), 'favorites_count', -1
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_to_shopping_totals(sender, instance, created, **kwargs):
+    if created:
+        ShoppingCartIngredient.objects.apply_cart_changes(
+            instance.user_id, [instance.recipe_id]
+        )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_recipe_from_shopping_totals(sender, instance, **kwargs):
+    ShoppingCartIngredient.objects.apply_cart_changes(
+        instance.user_id, [instance.recipe_id], sign=-1
+    )
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_recipe_ingredient(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance.previous_change = RecipeIngredient.objects.filter(
+            pk=instance.pk
+        ).values_list('recipe_id', 'ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def update_shopping_totals(sender, instance, **kwargs):
+    changes = [(instance.recipe_id, instance.ingredient_id, instance.amount)]
+    previous = getattr(instance, 'previous_change', None)
+    if previous:
+        recipe_id, ingredient_id, amount = previous
+        changes.append((recipe_id, ingredient_id, -amount))
+    ShoppingCartIngredient.objects.apply_recipe_changes(changes)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def subtract_shopping_totals(sender, instance, **kwargs):
+    ShoppingCartIngredient.objects.apply_recipe_changes(
+        [(instance.recipe_id, instance.ingredient_id, -instance.amount)]
+    )
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_author(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance.previous_author_id = Recipe.objects.filter(
+            pk=instance.pk
+        ).values_list('author_id', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def update_author_recipes_count(sender, instance, created, **kwargs):
+    previous_author_id = getattr(instance, 'previous_author_id', None)
+    if created:
+        change_counter(
+            User.objects.filter(pk=instance.author_id), 'recipes_count', 1
+        )
+    elif previous_author_id and previous_author_id != instance.author_id:
+        change_counter(
+            User.objects.filter(pk=previous_author_id), 'recipes_count', -1
+        )
+        change_counter(
+            User.objects.filter(pk=instance.author_id), 'recipes_count', 1
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created:
+        FeedEntry.objects.fan_out([instance])
+
+
+@receiver(post_save, sender=Subscription)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        FeedEntry.objects.backfill(
+            [(instance.subscriber_id, instance.author_id)]
+        )
+
+
+@receiver(post_delete, sender=Subscription)
+def prune_feed(sender, instance, **kwargs):
+    FeedEntry.objects.prune(instance.subscriber_id, instance.author_id)
+    subscribers_count = User.objects.filter(
+        pk=instance.author_id
+    ).values_list('subscribers_count', flat=True).first()
+    if subscribers_count == c.FEED_FANOUT_MAX_SUBSCRIBERS:
+        transaction.on_commit(lambda: FeedEntry.objects.backfill(
+            Subscription.objects.filter(author_id=instance.author_id)
+            .values_list('subscriber_id', 'author_id')
+        ))
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_index(sender, instance, **kwargs):
+    index_recipes([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_recipes([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_author_recipes_count(sender, instance, **kwargs):
+    change_counter(
+        User.objects.filter(pk=instance.author_id), 'recipes_count', -1
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def rebuild_reference_data(sender, **kwargs):
+    invalidate_reference_data()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def touch_recipe_on_ingredients_change(sender, instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).touch()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_recipes_on_tags_change(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        Recipe.objects.filter(pk=instance.pk).touch()
+    elif pk_set:
+        Recipe.objects.filter(pk__in=pk_set).touch()
+    else:
+        instance.recipes.touch()
+
+
+@receiver(post_save, sender=Tag)
+def touch_recipes_on_tag_change(sender, instance, created, **kwargs):
+    if not created:
+        instance.recipes.touch()
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_recipes_on_ingredient_change(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(ingredients=instance).touch()
+
+
+@receiver(post_save, sender=User)
+def touch_recipes_on_author_change(sender, instance, created, **kwargs):
+    if not created and instance.profile_changed():
+        instance.recipes.touch()
+
+
+@receiver(variants_ready, sender=User)
+def touch_recipes_on_avatar_variants(sender, pk, **kwargs):
+    Recipe.objects.filter(author_id=pk).touch()
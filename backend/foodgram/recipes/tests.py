@@ -0,0 +1,316 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import AutoField
+from django.test import TestCase
+from django.utils import timezone
+
+from foodgram import constants as c
+from recipes.management.commands.generate_data import COPY_FIELDS
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingCartIngredient, TrendingState
+)
+from recipes.trending import refresh_trending
+from users.models import Subscription
+
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass',
+            first_name='Author', last_name='Author'
+        )
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{i}', email=f'user{i}@example.com',
+                password='pass', first_name='User', last_name=f'{i}'
+            ) for i in range(3)
+        ]
+
+    def create_recipe(self, name='Рецепт'):
+        return Recipe.objects.create(
+            author=self.author, name=name, description='Описание',
+            time_to_cook=5
+        )
+
+    def test_favorites_count(self):
+        recipe = self.create_recipe()
+        for user in self.users:
+            Favorite.objects.create(user=user, recipe=recipe)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, len(self.users))
+        Favorite.objects.filter(user=self.users[0]).delete()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, len(self.users) - 1)
+
+    def test_bulk_create_refreshes_counters(self):
+        recipe = self.create_recipe()
+        Favorite.objects.bulk_create(
+            [Favorite(user=user, recipe=recipe) for user in self.users]
+        )
+        Subscription.objects.bulk_create([
+            Subscription(subscriber=user, author=self.author)
+            for user in self.users
+        ])
+        recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, len(self.users))
+        self.assertEqual(self.author.subscribers_count, len(self.users))
+
+    def test_recipes_and_subscribers_count(self):
+        recipe = self.create_recipe()
+        self.create_recipe('Второй рецепт')
+        Subscription.objects.create(
+            subscriber=self.users[0], author=self.author
+        )
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 2)
+        self.assertEqual(self.author.subscribers_count, 1)
+        recipe.delete()
+        Subscription.objects.all().delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+        self.assertEqual(self.author.subscribers_count, 0)
+
+    def test_stale_instance_save_keeps_counters(self):
+        recipe = self.create_recipe()
+        stale = Recipe.objects.get(pk=recipe.pk)
+        Favorite.objects.create(user=self.users[0], recipe=recipe)
+        stale.description = 'Новое описание'
+        stale.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def test_recalculate_counters_fixes_drift(self):
+        recipe = self.create_recipe()
+        Favorite.objects.create(user=self.users[0], recipe=recipe)
+        Recipe.objects.update(favorites_count=10)
+        User.objects.update(recipes_count=10)
+        call_command('recalculate_counters', stdout=StringIO())
+        recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(self.author.recipes_count, 1)
+
+
+class ShoppingTotalsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='pass',
+            first_name='User', last_name='User'
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г'
+            ) for i in range(3)
+        ]
+        cls.recipes = []
+        for i in range(2):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {i}',
+                description='Описание', time_to_cook=5
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=10 * (i + 1)
+                ) for ingredient in cls.ingredients[i:i + 2]
+            )
+            cls.recipes.append(recipe)
+
+    def get_totals(self):
+        return dict(
+            self.user.shopping_cart_ingredients.values_list(
+                'ingredient__name', 'amount'
+            )
+        )
+
+    def test_cart_changes_apply_deltas(self):
+        for recipe in self.recipes:
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        self.assertEqual(self.get_totals(), {
+            'Ингредиент 0': 10, 'Ингредиент 1': 30, 'Ингредиент 2': 20
+        })
+        ShoppingCart.objects.filter(recipe=self.recipes[0]).delete()
+        self.assertEqual(self.get_totals(), {
+            'Ингредиент 1': 20, 'Ингредиент 2': 20
+        })
+
+    def test_cart_row_rolls_back_with_failed_totals(self):
+        with mock.patch.object(
+            ShoppingCartIngredient.objects, 'apply_cart_changes',
+            side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                ShoppingCart(user=self.user, recipe=self.recipes[0]).save()
+        self.assertFalse(ShoppingCart.objects.exists())
+
+    def test_recipe_ingredient_changes_apply_deltas(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipes[0])
+        recipe_ingredient = self.recipes[0].recipe_ingredients.get(
+            ingredient=self.ingredients[1]
+        )
+        recipe_ingredient.amount = 15
+        recipe_ingredient.save()
+        self.recipes[0].recipe_ingredients.filter(
+            ingredient=self.ingredients[0]
+        ).delete()
+        RecipeIngredient.objects.create(
+            recipe=self.recipes[0], ingredient=self.ingredients[2], amount=5
+        )
+        self.assertEqual(self.get_totals(), {
+            'Ингредиент 1': 15, 'Ингредиент 2': 5
+        })
+        self.recipes[0].delete()
+        self.assertEqual(self.get_totals(), {})
+
+    def test_rebuild_fixes_drift(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipes[1])
+        expected = self.get_totals()
+        ShoppingCartIngredient.objects.update(amount=1)
+        ShoppingCartIngredient.objects.create(
+            user=self.user, ingredient=self.ingredients[0], amount=7
+        )
+        call_command('rebuild_shopping_totals', stdout=StringIO())
+        self.assertEqual(self.get_totals(), expected)
+
+    def test_forced_rebuild_reports_only_drifted_users(self):
+        other = User.objects.create_user(
+            username='other', email='other@example.com', password='pass',
+            first_name='Other', last_name='Other'
+        )
+        for user in (self.user, other):
+            ShoppingCart.objects.create(user=user, recipe=self.recipes[0])
+        ShoppingCartIngredient.objects.filter(user=other).update(amount=1)
+        output = StringIO()
+        call_command('rebuild_shopping_totals', force=True, stdout=output)
+        self.assertIn('исправлено пользователей - 1', output.getvalue())
+        self.assertEqual(
+            set(other.shopping_cart_ingredients.values_list(
+                'amount', flat=True
+            )),
+            {10}
+        )
+
+
+class TrendingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{i}', email=f'user{i}@example.com',
+                password='pass', first_name='User', last_name=f'{i}'
+            ) for i in range(3)
+        ]
+        cls.old, cls.new = (
+            Recipe.objects.create(
+                author=cls.users[0], name=name, description='Описание',
+                time_to_cook=5
+            ) for name in ('Старый', 'Новый')
+        )
+
+    def setUp(self):
+        patcher = mock.patch.object(c, 'TRENDING_SETTLE_DELAY', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_scores(self):
+        return dict(
+            Recipe.objects.values_list('name', 'trending_score')
+        )
+
+    def test_recent_interactions_outweigh_older_ones(self):
+        Favorite.objects.bulk_create(
+            Favorite(user=user, recipe=self.old) for user in self.users
+        )
+        Favorite.objects.update(
+            created_at=timezone.now() - timedelta(days=3)
+        )
+        Favorite.objects.create(user=self.users[0], recipe=self.new)
+        self.assertEqual(refresh_trending(), 2)
+        scores = self.get_scores()
+        self.assertGreater(scores['Новый'], scores['Старый'])
+        self.assertAlmostEqual(scores['Старый'], 3 / 8, places=2)
+        self.assertEqual(refresh_trending(), 0)
+        self.assertEqual(self.get_scores(), scores)
+        ShoppingCart.objects.create(user=self.users[1], recipe=self.old)
+        self.assertEqual(refresh_trending(), 1)
+        self.assertAlmostEqual(
+            self.get_scores()['Старый'],
+            scores['Старый'] + c.TRENDING_SHOPPING_CART_WEIGHT, places=2
+        )
+
+    def test_rebase_keeps_ranking(self):
+        Favorite.objects.create(user=self.users[0], recipe=self.old)
+        Favorite.objects.create(user=self.users[1], recipe=self.new)
+        Favorite.objects.filter(recipe=self.old).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+        refresh_trending()
+        epoch = timezone.now() - timedelta(
+            seconds=(c.TRENDING_REBASE_HALF_LIVES + 1) * c.TRENDING_HALF_LIFE
+        )
+        TrendingState.objects.update(epoch=epoch)
+        Recipe.objects.filter(pk=self.new.pk).update(trending_score=2 ** 33)
+        Recipe.objects.filter(pk=self.old.pk).update(trending_score=2 ** 32)
+        refresh_trending()
+        self.assertGreater(TrendingState.objects.get().epoch, epoch)
+        scores = self.get_scores()
+        self.assertAlmostEqual(scores['Новый'], 1, places=2)
+        self.assertAlmostEqual(scores['Старый'], 0.5, places=2)
+
+    def test_unsettled_rows_hold_watermark_back(self):
+        recent = Favorite.objects.create(user=self.users[0], recipe=self.old)
+        Favorite.objects.create(user=self.users[1], recipe=self.new)
+        Favorite.objects.filter(recipe=self.new).update(
+            created_at=timezone.now() - timedelta(hours=1)
+        )
+        with mock.patch.object(c, 'TRENDING_SETTLE_DELAY', 60):
+            self.assertEqual(refresh_trending(), 0)
+            Favorite.objects.filter(pk=recent.pk).update(
+                created_at=timezone.now() - timedelta(minutes=2)
+            )
+            self.assertEqual(refresh_trending(), 2)
+
+    def test_full_refresh_drops_removed_rows(self):
+        for user in self.users[:2]:
+            Favorite.objects.create(user=user, recipe=self.old)
+        Favorite.objects.create(user=self.users[0], recipe=self.new)
+        refresh_trending()
+        Favorite.objects.filter(recipe=self.old).delete()
+        refresh_trending(full=True)
+        scores = self.get_scores()
+        self.assertEqual(scores['Старый'], 0)
+        self.assertAlmostEqual(scores['Новый'], 1, places=2)
+        self.assertEqual(refresh_trending(), 0)
+
+
+class GenerateDataTest(TestCase):
+    def test_copy_fields_cover_required_columns(self):
+        for model, fields in COPY_FIELDS.items():
+            listed = {model._meta.get_field(name).name for name in fields}
+            required = {
+                field.name for field in model._meta.concrete_fields
+                if not field.null and not isinstance(field, AutoField)
+            }
+            with self.subTest(model=model.__name__):
+                self.assertLessEqual(required, listed)
+
+    def test_generated_rows_match_fields(self):
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        call_command(
+            'generate_data', users=5, recipes=10, no_copy=True,
+            stdout=StringIO()
+        )
+        self.assertEqual(User.objects.count(), 5)
+        recipe = Recipe.objects.first()
+        self.assertEqual(recipe.pic_variants, {})
+        self.assertEqual(recipe.recipe_ingredients.count(), 1)
@@ -0,0 +1,97 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Max, Min, Value, When
+from django.utils import timezone
+
+from foodgram import constants as c
+from recipes.models import Favorite, Recipe, ShoppingCart, TrendingState
+
+
+SOURCES = (
+    (Favorite, 'favorite_watermark', c.TRENDING_FAVORITE_WEIGHT),
+    (ShoppingCart, 'shopping_cart_watermark',
+     c.TRENDING_SHOPPING_CART_WEIGHT),
+)
+
+
+def get_weight(created_at, epoch):
+    return 2 ** (
+        (created_at - epoch).total_seconds() / c.TRENDING_HALF_LIFE
+    )
+
+
+def rebase(state, now):
+    factor = get_weight(state.epoch, now)
+    recipes = Recipe.objects.filter(trending_score__gt=0)
+    recipes.filter(
+        trending_score__lt=c.TRENDING_MIN_SCORE / factor
+    ).update(trending_score=0)
+    recipes.update(trending_score=F('trending_score') * factor)
+    state.epoch = now
+
+
+def add_scores(scores):
+    recipe_ids = sorted(scores)
+    batch_size = c.TRENDING_UPDATE_BATCH_SIZE
+    for start in range(0, len(recipe_ids), batch_size):
+        chunk = recipe_ids[start:start + batch_size]
+        Recipe.objects.filter(pk__in=chunk).update(
+            trending_score=F('trending_score') + Case(
+                *(
+                    When(pk=recipe_id, then=Value(scores[recipe_id]))
+                    for recipe_id in chunk
+                ),
+                default=Value(0.0),
+                output_field=FloatField()
+            )
+        )
+
+
+def collect_scores(state, cutoff, full, chunk_size):
+    scores = defaultdict(float)
+    for model, watermark, weight in SOURCES:
+        rows = model.objects.all()
+        if not full:
+            rows = rows.filter(pk__gt=getattr(state, watermark))
+        first_unsettled = rows.filter(created_at__gt=cutoff).aggregate(
+            first_id=Min('pk')
+        )['first_id']
+        if first_unsettled is not None:
+            rows = rows.filter(pk__lt=first_unsettled)
+        last_id = rows.aggregate(last_id=Max('pk'))['last_id']
+        if last_id is None:
+            if full:
+                setattr(state, watermark, 0)
+            continue
+        for recipe_id, created_at in rows.filter(
+            pk__lte=last_id
+        ).values_list('recipe_id', 'created_at').iterator(
+            chunk_size=chunk_size
+        ):
+            scores[recipe_id] += weight * get_weight(created_at, state.epoch)
+        setattr(state, watermark, last_id)
+    return scores
+
+
+def refresh_trending(chunk_size=c.TRENDING_CHUNK_SIZE, full=False):
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=c.TRENDING_SETTLE_DELAY)
+    with transaction.atomic():
+        TrendingState.objects.get_or_create(pk=1)
+        state = TrendingState.objects.select_for_update().get(pk=1)
+        if full:
+            Recipe.objects.filter(trending_score__gt=0).update(
+                trending_score=0
+            )
+            state.epoch = now
+        elif (
+            (now - state.epoch).total_seconds()
+            > c.TRENDING_REBASE_HALF_LIVES * c.TRENDING_HALF_LIFE
+        ):
+            rebase(state, now)
+        scores = collect_scores(state, cutoff, full, chunk_size)
+        add_scores(scores)
+        state.save()
+    return len(scores)
@@ -40,7 +40,8 @@ class SubscriptionAsAuthorInline(admin.TabularInline):
 @admin.register(FoodgramUser)
 class FoodgramUserAdmin(UserAdmin):
     list_display = (
-        'username', 'first_name', 'last_name', 'email', 'avatar'
+        'username', 'first_name', 'last_name', 'email', 'avatar',
+        'recipes_count', 'subscribers_count'
     )
     search_fields = ('username', 'first_name', 'last_name')
     list_filter = ('is_active', 'is_staff')
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-17 02:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_alter_foodgramuser_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='foodgramuser',
+            index=models.Index(fields=['first_name', 'last_name', 'id'], name='user_name_id_idx'),
+        ),
+    ]
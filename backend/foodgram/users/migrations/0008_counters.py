@@ -0,0 +1,30 @@
+# Generated by Django 3.2.3 on 2026-10-17 02:06
+
+from django.db import migrations, models
+import users.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='foodgramuser',
+            managers=[
+                ('objects', users.models.FoodgramUserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='foodgramuser',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество рецептов'),
+        ),
+        migrations.AddField(
+            model_name='foodgramuser',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество подписчиков'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.3 on 2026-10-17 02:41
+
+from django.db import migrations
+import foodgram.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='foodgramuser',
+            name='avatar',
+            field=foodgram.storage.ContentImageField(blank=True, db_index=True, help_text='Загрузите аватар пользователя', null=True, storage=foodgram.storage.ContentAddressedStorage(), upload_to='avatars/', verbose_name='Аватар'),
+        ),
+    ]
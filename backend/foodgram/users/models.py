@@ -1,13 +1,44 @@
-from django.contrib.auth.models import AbstractUser
+from django.apps import apps
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 from foodgram import constants as c
+from foodgram.counters import CounterFieldsMixin
+from foodgram.images import ImageVariantsMixin
+from foodgram.storage import ContentImageField
 
 
-class FoodgramUser(AbstractUser):
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class FoodgramUserQuerySet(models.QuerySet):
+    def refresh_counters(self):
+        return self.update(
+            recipes_count=count_subquery(
+                apps.get_model('recipes', 'Recipe'), 'author'
+            ),
+            subscribers_count=count_subquery(Subscription, 'author'),
+        )
+
+
+class FoodgramUserManager(UserManager.from_queryset(FoodgramUserQuerySet)):
+    pass
+
+
+class FoodgramUser(ImageVariantsMixin, CounterFieldsMixin, AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
+    counter_fields = ('recipes_count', 'subscribers_count')
+    computed_fields = ('avatar_variants',)
+    variant_fields = {'avatar': 'avatar_variants'}
+    profile_fields = ('email', 'username', 'first_name', 'last_name', 'avatar')
 
     username = models.CharField(
         max_length=c.NAME_MAX_LENGTH,
@@ -38,22 +69,79 @@ class FoodgramUser(AbstractUser):
         verbose_name='Фамилия',
         help_text='Введите фамилию пользователя'
     )
-    avatar = models.ImageField(
+    avatar = ContentImageField(
         upload_to='avatars/',
         blank=True,
         null=True,
         verbose_name='Аватар',
         help_text='Загрузите аватар пользователя'
     )
+    avatar_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Варианты аватара'
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов'
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков'
+    )
+
+    objects = FoodgramUserManager()
 
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
         ordering = ('first_name', 'last_name')
+        indexes = [
+            models.Index(
+                fields=('first_name', 'last_name', 'id'),
+                name='user_name_id_idx'
+            )
+        ]
 
     def __str__(self):
         return self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.stored_profile = instance.get_profile()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.stored_profile = self.get_profile()
+
+    def get_profile(self):
+        return {
+            field: getattr(self.__dict__[field], 'name', self.__dict__[field])
+            for field in self.profile_fields if field in self.__dict__
+        }
+
+    def profile_changed(self):
+        return getattr(self, 'stored_profile', None) != self.get_profile()
+
+
+class SubscriptionQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            FoodgramUser.objects.filter(
+                pk__in={obj.author_id for obj in objs}
+            ).refresh_counters()
+            apps.get_model('recipes', 'FeedEntry').objects.backfill(
+                (obj.subscriber_id, obj.author_id) for obj in objs
+            )
+        return created
+
 
 class Subscription(models.Model):
     subscriber = models.ForeignKey(
@@ -71,6 +159,8 @@ class Subscription(models.Model):
         help_text='Пользователь, на которого подписываются'
     )
 
+    objects = SubscriptionQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -87,3 +177,7 @@ class Subscription(models.Model):
 
     def __str__(self):
         return f'{self.subscriber.username} -> {self.author.username}'
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
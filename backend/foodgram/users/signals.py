@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from foodgram.counters import change_counter
+from users.models import FoodgramUser, Subscription
+
+
+@receiver(post_save, sender=Subscription)
+def increment_subscribers_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            FoodgramUser.objects.filter(pk=instance.author_id),
+            'subscribers_count', 1
+        )
+
+
+@receiver(post_delete, sender=Subscription)
+def decrement_subscribers_count(sender, instance, **kwargs):
+    change_counter(
+        FoodgramUser.objects.filter(pk=instance.author_id),
+        'subscribers_count', -1
+    )